@@ -13,6 +13,8 @@ from Summarizer.summarize_helper import summarize_thread_logic , summarize_conta
 
 
 class GmailConnector:
+    BATCH_LIMIT = 100  # Gmail API maximum calls per batch request
+
     def __init__(self):
         self.auth = GmailAuth()
         self.service = self.auth.authenticate()
@@ -27,11 +29,16 @@ class GmailConnector:
             threads = results.get("threads", [])
             enriched_threads = []
 
+            # Fetch all threads in one batched round-trip to get sender & subject
+            fetched = self._get_threads([t["id"] for t in threads])
+
             for t in threads:
                 thread_id = t["id"]
 
-                # Fetch one thread to get sender & subject (cheap lightweight call)
-                thread = self.service.users().threads().get(userId="me", id=thread_id).execute()
+                thread = fetched.get(thread_id)
+                if not isinstance(thread, dict):
+                    print(f"[GmailConnector] Gmail API error for thread {thread_id}: {thread}")
+                    continue
                 messages = thread.get("messages", [])
                 if not messages:
                     continue
@@ -72,6 +79,40 @@ class GmailConnector:
         except HttpError as e:
             return {"error": f"Gmail API error: {e}"}
 
+    def get_messages(self, thread_ids):
+        """Batched get_message: {thread_id: parsed messages or {"error": ...}}."""
+        try:
+            fetched = self._get_threads(thread_ids)
+        except HttpError as e:
+            return {tid: {"error": f"Gmail API error: {e}"} for tid in thread_ids}
+
+        return {
+            tid: self._parse_thread(thread) if isinstance(thread, dict)
+            else {"error": f"Gmail API error: {thread}"}
+            for tid, thread in fetched.items()
+        }
+
+    def _get_threads(self, thread_ids):
+        """Fetch full threads with batch requests (up to BATCH_LIMIT per HTTP call).
+
+        Returns {thread_id: thread dict, or the HttpError for that thread}.
+        """
+        thread_ids = list(dict.fromkeys(thread_ids))  # batch request ids must be unique
+        results = {}
+
+        def _collect(request_id, response, exception):
+            results[request_id] = exception if exception is not None else response
+
+        for start in range(0, len(thread_ids), self.BATCH_LIMIT):
+            batch = self.service.new_batch_http_request(callback=_collect)
+            for thread_id in thread_ids[start:start + self.BATCH_LIMIT]:
+                batch.add(
+                    self.service.users().threads().get(userId="me", id=thread_id),
+                    request_id=thread_id,
+                )
+            batch.execute()
+        return results
+
     # ------------------------------------------------------
     # NEW: Fetch all threads for a contact (for summarizing)
     # ------------------------------------------------------
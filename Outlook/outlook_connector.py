@@ -1,8 +1,27 @@
 # Outlook/outlook_connector.py
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from Outlook.outlook_auth import OutlookAuth
 
 
+def _build_session():
+    """Pooled keep-alive session for Graph calls; retries GETs on 429/5xx."""
+    session = requests.Session()
+    # Only idempotent GETs are retried: sendMail/reply POSTs are never resent,
+    # so a retry can't deliver a duplicate email. Backoff sleeps 0, 2, 4, 8, 16s
+    # (~30s worst case, longer only if Graph sends a larger Retry-After).
+    retry = Retry(
+        total=5,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    )
+    session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry))
+    return session
+
+
 class OutlookConnector:
     """
     Provides methods to fetch, normalize, and summarize Outlook email data
@@ -14,6 +33,7 @@ class OutlookConnector:
         self.auth = OutlookAuth()
         self.token = None
         self.user_email = None  # Detected mailbox address
+        self.session = _build_session()
 
     # ------------------------------------------------------
     # AUTH & HELPERS
@@ -26,7 +46,7 @@ class OutlookConnector:
         if not self.user_email:
             # Detect mailbox identity
             url = "https://graph.microsoft.com/v1.0/me"
-            resp = requests.get(url, headers=self._headers())
+            resp = self.session.get(url, headers=self._headers())
             if resp.status_code == 200:
                 self.user_email = resp.json().get("userPrincipalName") or resp.json().get("mail")
                 print(f"✅ Detected Outlook mailbox: {self.user_email}")
@@ -53,7 +73,7 @@ class OutlookConnector:
             },
             "saveToSentItems": True,
         }
-        resp = requests.post(url, headers={**self._headers(), "Content-Type": "application/json"}, json=payload)
+        resp = self.session.post(url, headers={**self._headers(), "Content-Type": "application/json"}, json=payload)
         if resp.status_code not in (200, 202):
             raise Exception(f"Outlook send failed: {resp.text}")
 
@@ -70,11 +90,11 @@ class OutlookConnector:
             f"&$select=id,conversationId,subject,from,toRecipients,body,bodyPreview,receivedDateTime"
         )
 
-        response = requests.get(url, headers=self._headers())
+        response = self.session.get(url, headers=self._headers())
 
         if response.status_code == 401:
             self.token = self.auth.get_access_token(force_refresh=True)
-            response = requests.get(url, headers=self._headers())
+            response = self.session.get(url, headers=self._headers())
 
         if response.status_code == 200:
             data = response.json()
@@ -100,7 +120,7 @@ class OutlookConnector:
             f"?$top={top}"
             f"&$select=id,conversationId,subject,from,toRecipients,body,bodyPreview,receivedDateTime"
         )
-        response = requests.get(url, headers=self._headers())
+        response = self.session.get(url, headers=self._headers())
 
         if response.status_code != 200:
             raise Exception(f"Error fetching messages: {response.text}")
@@ -168,10 +188,10 @@ class OutlookConnector:
             f"&$top={top}"
             f"&$select=id,conversationId,subject,from,toRecipients,body,bodyPreview,receivedDateTime"
         )
-        response = requests.get(url, headers=self._headers())
+        response = self.session.get(url, headers=self._headers())
         if response.status_code == 401:
             self.token = self.auth.get_access_token(force_refresh=True)
-            response = requests.get(url, headers=self._headers())
+            response = self.session.get(url, headers=self._headers())
 
         if response.status_code != 200:
             raise Exception(f"Error fetching conversation: {response.text}")
@@ -230,11 +250,11 @@ class OutlookConnector:
         """Retrieve full email details by ID."""
         self.ensure_authenticated()
         url = f"https://graph.microsoft.com/v1.0/me/messages/{message_id}"
-        response = requests.get(url, headers=self._headers())
+        response = self.session.get(url, headers=self._headers())
 
         if response.status_code == 401:
             self.token = self.auth.get_access_token(force_refresh=True)
-            response = requests.get(url, headers=self._headers())
+            response = self.session.get(url, headers=self._headers())
 
         if response.status_code == 200:
             return self._normalize_message(response.json(), full=True)
@@ -265,7 +285,7 @@ class OutlookConnector:
         try:
             # First, get the original message to include in the reply
             msg_url = f"https://graph.microsoft.com/v1.0/me/messages/{message_id}?$select=conversationId,internetMessageId,sender"
-            msg_resp = requests.get(msg_url, headers=headers)
+            msg_resp = self.session.get(msg_url, headers=headers)
             
             if msg_resp.status_code != 200:
                 print(f"[Outlook] Failed to get message details: {msg_resp.text}")
@@ -279,7 +299,7 @@ class OutlookConnector:
             formatted_body = f"{reply_body}\n\n---\nOriginal message:\n{'-'*20}\n"
             
             # Get the sender's email address from the profile
-            me = requests.get("https://graph.microsoft.com/v1.0/me", headers=headers).json()
+            me = self.session.get("https://graph.microsoft.com/v1.0/me", headers=headers).json()
             sender_email = me.get('mail') or me.get('userPrincipalName')
             
             # Send the reply using the reply endpoint to maintain thread
@@ -299,7 +319,7 @@ class OutlookConnector:
                 "comment": ""
             }
             
-            response = requests.post(url, headers=headers, json=payload)
+            response = self.session.post(url, headers=headers, json=payload)
             if response.status_code not in (200, 202):
                 print(f"[Outlook] Failed to send reply: {response.text}")
                 # Fallback to basic send if reply fails
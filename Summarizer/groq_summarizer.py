@@ -1,22 +1,86 @@
+import asyncio
 import os
-import json
+import random
+import threading
 import time
 from dotenv import load_dotenv
 import sys
 import io
 from classifier.email_classifier import classify_email, classify_role
+from providers.utils import save_json_atomic, json_load_file
 from collections import Counter
 from datetime import datetime
 try:
-    from groq import Groq
+    from groq import AsyncGroq, Groq
 except ImportError:
-    Groq = None
+    AsyncGroq = Groq = None
 
 import requests 
 
 
 
+# Backoff between retries of a rate-limited (429) Groq call: doubled per
+# attempt, with jitter so concurrent callers don't retry in lockstep. A
+# Retry-After header on the error's HTTP response takes precedence.
+BACKOFF_BASE = 1.0       # seconds
+BACKOFF_JITTER = 1.0     # random extra seconds
+BACKOFF_MAX_DELAY = 30.0
+
+
+def _is_rate_limited(exc) -> bool:
+    msg = str(exc)
+    return getattr(exc, "status_code", None) == 429 or "rate_limit" in msg.lower() or "429" in msg
+
+
+def _retry_after(exc):
+    """Seconds from a Retry-After header on the exception's HTTP response, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# Monotonic time before which an API key should not be used (set on 429s).
+# Module-level so every worker thread, and every summarizer instance in the
+# process, backs off instead of each spending a request to rediscover the limit.
+_groq_cooldown_until = {}  # api key -> monotonic deadline
+_groq_cooldown_lock = threading.Lock()
+
+
+def _groq_cooldown_remaining(api_key: str) -> float:
+    """Seconds left on this key's rate-limit cooldown (<= 0 when none)."""
+    with _groq_cooldown_lock:
+        return _groq_cooldown_until.get(api_key, 0.0) - time.monotonic()
+
+
+def _wait_for_groq_cooldown(api_key: str) -> None:
+    """Sleep until any active rate-limit cooldown on this key has passed."""
+    wait = _groq_cooldown_remaining(api_key)
+    if wait > 0:
+        time.sleep(wait)
+
+
+def _start_groq_cooldown(api_key: str, delay: float) -> None:
+    """Hold off calls on this key for `delay` seconds (never shortens a cooldown)."""
+    with _groq_cooldown_lock:
+        deadline = time.monotonic() + delay
+        _groq_cooldown_until[api_key] = max(_groq_cooldown_until.get(api_key, 0.0), deadline)
+
+
+def _backoff_delay(exc, attempt: int) -> float:
+    delay = _retry_after(exc)
+    if delay is None:
+        delay = BACKOFF_BASE * (2 ** attempt) + random.uniform(0, BACKOFF_JITTER)
+    return min(delay, BACKOFF_MAX_DELAY)
+
+
 load_dotenv()
+
+# Retries per API key before rotating to the next one
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "5"))
 if not sys.stdout.encoding or sys.stdout.encoding.lower() != "utf-8":
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="ignore")
 
@@ -33,12 +97,13 @@ class GroqSummarizer:
         self.provider = os.getenv("PROVIDER", "groq").lower()
         self.cache_path = cache_path or os.path.join(summaries_dir, "summaries_cache.json")
         self.ttl_seconds = ttl_hours * 3600  # Convert hours to seconds
+        # Guards self.cache: threads may be summarized concurrently
+        self._cache_lock = threading.RLock()
 
         # ✅ Load cache safely and ensure it's a dict
         if os.path.exists(self.cache_path):
             try:
-                with open(self.cache_path, "r", encoding="utf-8") as f:
-                    self.cache = json.load(f)
+                self.cache = json_load_file(self.cache_path)
                 if not isinstance(self.cache, dict):
                     print("[WARN] summaries_cache.json was not a dict, resetting...")
                     self.cache = {}
@@ -62,6 +127,9 @@ class GroqSummarizer:
                 os.getenv("GROQ_API_KEY_4")
             ]
             self.client = self._initialize_groq_client()
+            # One client (and HTTP connection pool) per API key, built on first use
+            self._groq_clients = {}
+            self._async_groq_clients = {}  # same, for streamed replies
             self.model = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
 
         else:
@@ -76,8 +144,7 @@ class GroqSummarizer:
     def _load_cache(self):
         try:
             if os.path.exists(self.cache_path):
-                with open(self.cache_path, "r", encoding="utf-8") as f:
-                    return json.load(f)
+                return json_load_file(self.cache_path)
         except Exception as e:
             print(f"[WARN] Cache load failed: {e}. Resetting.")
             return {}
@@ -85,20 +152,21 @@ class GroqSummarizer:
 
 
     def _save_cache(self):
-        with open(self.cache_path, "w", encoding="utf-8", errors="ignore") as f:
-            json.dump(self.cache, f, indent=2, ensure_ascii=False)
+        with self._cache_lock:
+            save_json_atomic(self.cache_path, self.cache)
 
     def _cleanup_expired_cache(self):
         """Remove entries that exceeded TTL."""
         now = time.time()
-        keys_to_delete = [
-            k for k, v in self.cache.items()
-            if "timestamp" in v and now - v["timestamp"] > self.ttl_seconds
-        ]
-        for k in keys_to_delete:
-            self.cache.pop(k, None)
-        if keys_to_delete:
-            self._save_cache()
+        with self._cache_lock:
+            keys_to_delete = [
+                k for k, v in self.cache.items()
+                if isinstance(v, dict) and "timestamp" in v and now - v["timestamp"] > self.ttl_seconds
+            ]
+            for k in keys_to_delete:
+                self.cache.pop(k, None)
+            if keys_to_delete:
+                self._save_cache()
 
     # --------------------
     # Per-contact cache management
@@ -112,29 +180,32 @@ class GroqSummarizer:
         if not entry:
             return None
         if time.time() - entry.get("timestamp", 0) > self.ttl_seconds:
-            self.cache.pop(key, None)
-            self._save_cache()
+            with self._cache_lock:
+                self.cache.pop(key, None)
+                self._save_cache()
             return None
         return entry.get("summary")
 
     def _set_cache(self, source, contact_email, thread_id, summary):
         key = self._get_cache_key(source, contact_email, thread_id)
-        self.cache[key] = {
-            "summary": summary,
-            "timestamp": time.time()
-        }
-        self._save_cache()
+        with self._cache_lock:
+            self.cache[key] = {
+                "summary": summary,
+                "timestamp": time.time()
+            }
+            self._save_cache()
 
     def _clear_contact_cache(self, source, contact_email):
         """
         Clear all cached summaries related to a contact (thread-level and contact-wide).
         """
         prefix = f"{source}:{contact_email}"
-        keys_to_remove = [k for k in self.cache if k == prefix or k.startswith(prefix + ":")]
-        for k in keys_to_remove:
-            self.cache.pop(k, None)
-        if keys_to_remove:
-            self._save_cache()
+        with self._cache_lock:
+            keys_to_remove = [k for k in self.cache if k == prefix or k.startswith(prefix + ":")]
+            for k in keys_to_remove:
+                self.cache.pop(k, None)
+            if keys_to_remove:
+                self._save_cache()
 
 
     # --------------------------------------------------------------------
@@ -151,13 +222,21 @@ class GroqSummarizer:
             print(f"Error initializing Groq client with key {key_index + 1}: {str(e)}")
             return self._initialize_groq_client(key_index + 1)  # Try next key
 
-    def _call_groq_api_with_retry(self, prompt: str, max_retries: int = 3, key_index: int = 0) -> str:
+    def _get_groq_client(self, key_index: int):
+        """Return the Groq client for an API key, reusing its connection pool."""
+        client = self._groq_clients.get(key_index)
+        if client is None:
+            client = self._groq_clients[key_index] = Groq(api_key=self.api_keys[key_index])
+        return client
+
+    def _call_groq_api_with_retry(self, prompt: str, max_retries: int = GROQ_MAX_RETRIES, key_index: int = 0) -> str:
         """Call Groq API with retry mechanism and key rotation"""
         if key_index >= len(self.api_keys) or not self.api_keys[key_index]:
             return "Error: No valid API key available"
         
         try:
-            client = Groq(api_key=self.api_keys[key_index])
+            _wait_for_groq_cooldown(self.api_keys[key_index])
+            client = self._get_groq_client(key_index)
             response = client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
@@ -165,17 +244,62 @@ class GroqSummarizer:
             return response.choices[0].message.content.strip()
         except Exception as e:
             print(f"Error with key {key_index + 1}: {str(e)}")
+            if _is_rate_limited(e):
+                # The retry (and any other thread on this key) waits this out
+                _start_groq_cooldown(
+                    self.api_keys[key_index], _backoff_delay(e, GROQ_MAX_RETRIES - max_retries)
+                )
             if max_retries > 0:
                 return self._call_groq_api_with_retry(prompt, max_retries - 1, key_index)
             elif key_index + 1 < len(self.api_keys) and self.api_keys[key_index + 1]:
                 print(f"Trying next API key...")
-                return self._call_groq_api_with_retry(prompt, 3, key_index + 1)
+                return self._call_groq_api_with_retry(prompt, GROQ_MAX_RETRIES, key_index + 1)
             return f"Error calling Groq API: {str(e)}"
 
     def _call_groq_api(self, prompt: str) -> str:
         """Call Groq API with the given prompt and return the response."""
         return self._call_groq_api_with_retry(prompt)
 
+    def _get_async_groq_client(self, key_index: int):
+        """Return the AsyncGroq client for an API key, reusing its connection pool."""
+        client = self._async_groq_clients.get(key_index)
+        if client is None:
+            client = self._async_groq_clients[key_index] = AsyncGroq(api_key=self.api_keys[key_index])
+        return client
+
+    async def _run_groq_model_stream(self, prompt):
+        """
+        Stream the model's reply as text deltas (stream=True).
+        Falls through the API keys until one opens a stream; errors after the
+        first delta propagate, since the partial reply has already been sent.
+        """
+        last_error = None
+        for key_index, api_key in enumerate(self.api_keys):
+            if not api_key:
+                continue
+            try:
+                # Honour the cooldown the summarizer workers share, without blocking the loop
+                wait = _groq_cooldown_remaining(api_key)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                stream = await self._get_async_groq_client(key_index).chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    stream=True,
+                )
+            except Exception as e:
+                print(f"Error with key {key_index + 1}: {str(e)}")
+                if _is_rate_limited(e):
+                    _start_groq_cooldown(api_key, _backoff_delay(e, 0))
+                last_error = e
+                continue
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+            return
+        raise RuntimeError(f"Error calling Groq API: {last_error or 'No valid API key available'}")
+
     def _run_groq_model(self, prompt):
         """
         Unified model handler — works with Groq, OpenAI.
@@ -286,17 +410,18 @@ class GroqSummarizer:
         # 5. Save summary + classification in cache
         if thread_id and source and contact_email:
             cache_key = self._get_cache_key(source, contact_email, thread_id)
-            self.cache[cache_key] = {
-                "summary": summary,
-                "subject": thread_emails[0].get("subject", ""),
-                "preview": thread_emails[0].get("body", "")[:100],  # optional preview
-                "role": role,
-                "importance": importance,
-                "role_confidence": role_conf,
-                "importance_confidence": importance_conf,
-                "timestamp": time.time()
-            }
-            self._save_cache()
+            with self._cache_lock:
+                self.cache[cache_key] = {
+                    "summary": summary,
+                    "subject": thread_emails[0].get("subject", ""),
+                    "preview": thread_emails[0].get("body", "")[:100],  # optional preview
+                    "role": role,
+                    "importance": importance,
+                    "role_confidence": role_conf,
+                    "importance_confidence": importance_conf,
+                    "timestamp": time.time()
+                }
+                self._save_cache()
 
         return summary
 
@@ -349,23 +474,22 @@ class GroqSummarizer:
         contact_role_conf = 0
         
         if thread_ids:
-            # Collect all roles from cached threads
-            roles = []
-            role_confs = []
-            
+            # Tally roles from cached threads in one pass
+            role_counter = Counter()
+            role_conf_sum = 0
+
             for tid in thread_ids:
                 cache_key = self._get_cache_key(source, contact_email, tid)
-                entry = self.cache.get(cache_key, {})
-                if entry.get("role") and entry.get("role") != "Unknown":
-                    roles.append(entry["role"])
-                    role_confs.append(entry.get("role_confidence", 0))
-            
+                role = self.cache.get(cache_key, {}).get("role")
+                if role and role != "Unknown":
+                    role_counter[role] += 1
+                    role_conf_sum += self.cache[cache_key].get("role_confidence", 0)
+
             # If we have roles, use the most common one
-            if roles:
-                role_counter = Counter(roles)
+            if role_counter:
                 contact_role = role_counter.most_common(1)[0][0]
-                # Average confidence for this role
-                contact_role_conf = sum(role_confs) / len(role_confs) if role_confs else 0
+                # Average confidence across the classified threads
+                contact_role_conf = role_conf_sum / sum(role_counter.values())
             else:
                 # Classify role once for the contact
                 try:
@@ -396,49 +520,50 @@ class GroqSummarizer:
 
         # Add per-thread summaries with THREAD-LEVEL importance
         if thread_ids:
-            for tid in thread_ids:
-                cache_key = self._get_cache_key(source, contact_email, tid)
-                entry = self.cache.get(cache_key, {})
-                subject = entry.get("subject", "")
-                preview = entry.get("preview", "")
-                body = preview or subject
-
-                # ✅ Each thread gets its own importance classification
-                importance = entry.get("importance", "Unknown")
-                importance_conf = entry.get("importance_confidence", 0)
-
-                if importance == "Unknown":
-                    try:
-                        from classifier.email_classifier import classify_importance
-                        email_text = f"From: {contact_email}\nSubject: {subject}\nBody: {body}"
-                        importance, importance_conf = classify_importance(email_text)
-
-                        # Update cache with thread importance
-                        entry["importance"] = importance
-                        entry["importance_confidence"] = importance_conf
-                        self.cache[cache_key] = entry
-                    except Exception as e:
-                        print(f"[Classifier ERROR] Failed to classify importance: {e}")
-                        importance = "Unknown"
-                        importance_conf = 0
-
-                # ✅ Store contact-level role in each thread cache entry for consistency
-                entry["role"] = contact_role
-                entry["role_confidence"] = contact_role_conf
-                self.cache[cache_key] = entry
-
-                contact_entry["threads"].append({
-                    "id": tid,
-                    "subject": subject,
-                    "preview": preview,
-                    "summary": entry.get("summary", ""),
-                    "role": contact_role,  # ✅ Same role for all threads from this contact
-                    "importance": importance,  # ✅ Thread-specific importance
-                    "importance_confidence": round(importance_conf, 3)
-                })
-
-            # Save cache after updating roles/importance
-            self._save_cache()
+            with self._cache_lock:
+                for tid in thread_ids:
+                    cache_key = self._get_cache_key(source, contact_email, tid)
+                    entry = self.cache.get(cache_key, {})
+                    subject = entry.get("subject", "")
+                    preview = entry.get("preview", "")
+                    body = preview or subject
+
+                    # ✅ Each thread gets its own importance classification
+                    importance = entry.get("importance", "Unknown")
+                    importance_conf = entry.get("importance_confidence", 0)
+
+                    if importance == "Unknown":
+                        try:
+                            from classifier.email_classifier import classify_importance
+                            email_text = f"From: {contact_email}\nSubject: {subject}\nBody: {body}"
+                            importance, importance_conf = classify_importance(email_text)
+
+                            # Update cache with thread importance
+                            entry["importance"] = importance
+                            entry["importance_confidence"] = importance_conf
+                            self.cache[cache_key] = entry
+                        except Exception as e:
+                            print(f"[Classifier ERROR] Failed to classify importance: {e}")
+                            importance = "Unknown"
+                            importance_conf = 0
+
+                    # ✅ Store contact-level role in each thread cache entry for consistency
+                    entry["role"] = contact_role
+                    entry["role_confidence"] = contact_role_conf
+                    self.cache[cache_key] = entry
+
+                    contact_entry["threads"].append({
+                        "id": tid,
+                        "subject": subject,
+                        "preview": preview,
+                        "summary": entry.get("summary", ""),
+                        "role": contact_role,  # ✅ Same role for all threads from this contact
+                        "importance": importance,  # ✅ Thread-specific importance
+                        "importance_confidence": round(importance_conf, 3)
+                    })
+
+                # Save cache after updating roles/importance
+                self._save_cache()
 
         return contact_entry
 
@@ -1,7 +1,27 @@
 from Summarizer.groq_summarizer import GroqSummarizer
+import threading
 import traceback
 
-summarizer = GroqSummarizer()
+# One GroqSummarizer (and summary cache) per process, built on first use so
+# that importing the connectors doesn't construct it
+_summarizer = None
+_summarizer_lock = threading.Lock()
+
+
+def get_summarizer() -> GroqSummarizer:
+    global _summarizer
+    if _summarizer is None:
+        with _summarizer_lock:
+            if _summarizer is None:
+                _summarizer = GroqSummarizer()
+    return _summarizer
+
+
+def __getattr__(name):
+    # Keeps `from Summarizer.summarize_helper import summarizer` working
+    if name == "summarizer":
+        return get_summarizer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def summarize_thread_logic(source: str, contact_email: str, thread_id: str, text=None, thread_obj=None, force=False):
@@ -11,9 +31,9 @@ def summarize_thread_logic(source: str, contact_email: str, thread_id: str, text
     """
     try:
         if force:
-            summarizer._clear_contact_cache(source, contact_email)
+            get_summarizer()._clear_contact_cache(source, contact_email)
 
-        cached_summary = summarizer._get_from_cache(source, contact_email, thread_id)
+        cached_summary = get_summarizer()._get_from_cache(source, contact_email, thread_id)
         if cached_summary:
             print(f"⚡ Using cached summary for {contact_email}:{thread_id}")
             return {"thread_id": thread_id, "summary": cached_summary, "used_cache": True}
@@ -37,6 +57,7 @@ def summarize_thread_logic(source: str, contact_email: str, thread_id: str, text
         if not combined or len(combined.strip()) < 20:
             return {"thread_id": thread_id, "summary": "No meaningful content to summarize."}
 
+        summarizer = get_summarizer()
         summary = summarizer.summarize_text(combined)
         summarizer._set_cache(source, contact_email, thread_id, summary)
 
@@ -69,7 +90,7 @@ def summarize_contact_logic(source: str, contact_email: str, fetch_fn, top: int
             s = summarize_thread_logic(source, contact_email, thread_id, thread_obj=thread, force=force_refresh)
 
         summaries_texts = [t["summary"] for t in thread_summaries if "summary" in t]
-        contact_summary = summarizer.summarize_contact_threads(
+        contact_summary = get_summarizer().summarize_contact_threads(
             summaries_texts, source=source, contact_email=contact_email, force=force_refresh
         ) if summaries_texts else ""
 
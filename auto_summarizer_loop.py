@@ -1,63 +1,111 @@
 # auto_summarizer_loop.py
-import json
+import hashlib
+import logging
 import os
 import time
 import re
 from datetime import datetime, timezone, timedelta
 from collections import defaultdict , Counter
+from functools import lru_cache
 from Gmail.gmail_connector import GmailConnector
 from Outlook.outlook_connector import OutlookConnector
 from Summarizer.summarize_helper import summarize_thread_logic , summarize_contact_logic
 from integrations.cache_to_sheets import push_cached_summaries_to_sheets
 from classifier.email_classifier import classify_email
 from providers.summaries_provider import SummariesProvider
-from integrations.google_calendar import GoogleCalendar
+from providers.utils import write_bytes_atomic, json_dumps_bytes, json_load_file
+from integrations.google_calendar import GoogleCalendar, MEETING_KEYWORDS
 from dateutil import parser
 from typing import Optional, Dict, Any
 
+logger = logging.getLogger("summarizer")
+
 # -----------------------------
 # Cache file
 # -----------------------------
 SUMMARY_CACHE = "Summaries/summaries_cache.json"
 
+# Most recent message IDs remembered as processed; older ones are dropped
+PROCESSED_EMAILS_MAX = int(os.getenv("PROCESSED_EMAILS_MAX", "10000"))
+
+# Most recently seen thread IDs kept per source
+SEEN_THREADS_MAX = int(os.getenv("SEEN_THREADS_MAX", "10000"))
+
+# Most recently created calendar events remembered for deduplication. Never
+# smaller than PROCESSED_EMAILS_MAX: an email whose ID ages out of
+# processed_emails is only kept from creating a duplicate event by this map.
+CALENDAR_EVENTS_MAX = max(
+    int(os.getenv("CALENDAR_EVENTS_MAX", str(PROCESSED_EMAILS_MAX))), PROCESSED_EMAILS_MAX
+)
+
+# Poll every POLL_INTERVAL seconds while mail is arriving; back off (doubling)
+# up to POLL_MAX_INTERVAL while the inboxes are idle
+POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "10"))
+POLL_MAX_INTERVAL = int(os.getenv("POLL_MAX_INTERVAL", "300"))
+
+# Expired thread-summary entries are purged at most this often (seconds)
+CLEANUP_INTERVAL_SEC = 600
+
+
+def _trim_oldest(entries: dict, cap: int) -> None:
+    """Keep only the `cap` most recently inserted keys of `entries`, in place."""
+    if len(entries) <= cap:
+        return
+    recent = list(entries.items())[-cap:] if cap > 0 else []
+    entries.clear()
+    entries.update(recent)
+
 def load_cache():
     os.makedirs(os.path.dirname(SUMMARY_CACHE), exist_ok=True)
 
     if not os.path.exists(SUMMARY_CACHE):
         return {
             "summaries": {},
-            "seen": {"gmail": set(), "outlook": set()},
-            "processed_emails": set(),
+            "seen": {"gmail": {}, "outlook": {}},
+            "processed_emails": {},
             "calendar_events": {},
             "last_updated": None
         }
 
     try:
-        with open(SUMMARY_CACHE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = json_load_file(SUMMARY_CACHE)
 
         return {
             "summaries": data.get("summaries", {}),
             "seen": {
-                "gmail": set(data.get("seen", {}).get("gmail", [])),
-                "outlook": set(data.get("seen", {}).get("outlook", []))
+                "gmail": dict.fromkeys(data.get("seen", {}).get("gmail", [])),
+                "outlook": dict.fromkeys(data.get("seen", {}).get("outlook", []))
             },
-            "processed_emails": set(data.get("processed_emails", [])),
+            # Insertion-ordered so the oldest IDs can be trimmed first
+            "processed_emails": dict.fromkeys(data.get("processed_emails", [])),
             "calendar_events": data.get("calendar_events", {}),
             "last_updated": data.get("last_updated")
         }
 
     except Exception as e:
-        print(f"[ERROR] Cache corrupted: {e}")
+        logger.error("[ERROR] Cache corrupted: %s", e)
         return {
             "summaries": {},
-            "seen": {"gmail": set(), "outlook": set()},
-            "processed_emails": set(),
+            "seen": {"gmail": {}, "outlook": {}},
+            "processed_emails": {},
             "calendar_events": {},
             "last_updated": None
         }
 
+# (sha256 of the bytes last written, (mtime_ns, size) of the file after writing)
+_last_saved = None
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
 def save_cache(cache):
+    global _last_saved
     os.makedirs(os.path.dirname(SUMMARY_CACHE), exist_ok=True)
 
     safe_cache = {
@@ -71,12 +119,45 @@ def save_cache(cache):
         "last_updated": cache.get("last_updated")
     }
 
-    with open(SUMMARY_CACHE, "w", encoding="utf-8") as f:
-        json.dump(safe_cache, f, indent=2, ensure_ascii=False)
+    payload = json_dumps_bytes(safe_cache)
+    digest = hashlib.sha256(payload).digest()
+
+    # Skip the write when these exact bytes are already on disk. The stat check
+    # catches SummariesProvider, which rewrites the file every cycle without the
+    # processed_emails/calendar_events maps, so the loop's save then still runs.
+    if _last_saved and _last_saved[0] == digest and _last_saved[1] == _file_signature(SUMMARY_CACHE):
+        return
+
+    # Atomic temp-file + rename, so no read-back merge is needed
+    write_bytes_atomic(SUMMARY_CACHE, payload)
+    _last_saved = (digest, _file_signature(SUMMARY_CACHE))
 
 # -----------------------------
 # Date parsing helper
 # -----------------------------
+DATE_FORMATS = (
+    '%Y-%m-%dT%H:%M:%S%z',
+    '%Y-%m-%d %H:%M:%S%z',
+    '%Y-%m-%dT%H:%M:%S.%fZ',
+    '%Y-%m-%dT%H:%M:%SZ',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d',
+    '%d-%m-%Y %H:%M',
+    '%m/%d/%Y %I:%M %p',
+)
+
+# Fields that make up a calendar event dedup key, in key order
+EVENT_KEY_FIELDS = ('source', 'thread_id', 'start_time')
+
+# Optional cap on how much of the email body is copied into a calendar event
+# description. The default, 0, copies the whole body; set it to trim very
+# long emails.
+EVENT_DESCRIPTION_MAX_BODY = int(os.getenv("EVENT_DESCRIPTION_MAX_BODY", "0"))
+
+# Shared Google Calendar client, created on first use
+_calendar_client = None
+
+
 def _parse_date(date_str):
     """Parse date string to datetime object (UTC) handling multiple formats."""
     if not date_str:
@@ -85,18 +166,26 @@ def _parse_date(date_str):
     if isinstance(date_str, datetime):
         return date_str.astimezone(timezone.utc) if date_str.tzinfo else date_str.replace(tzinfo=timezone.utc)
 
-    date_formats = [
-        '%Y-%m-%dT%H:%M:%S%z',
-        '%Y-%m-%d %H:%M:%S%z',
-        '%Y-%m-%dT%H:%M:%S.%fZ',
-        '%Y-%m-%dT%H:%M:%SZ',
-        '%Y-%m-%d %H:%M:%S',
-        '%Y-%m-%d',
-        '%d-%m-%Y %H:%M',
-        '%m/%d/%Y %I:%M %p',
-    ]
-
-    for fmt in date_formats:
+    if isinstance(date_str, str):
+        return _parse_date_str(date_str)
+    return _parse_timestamp(date_str)
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_str(date_str):
+    """String branch of _parse_date, memoized since threads repeat timestamps."""
+    # Fast path: ISO 8601 strings (the common case) parse in C, no format loop
+    if len(date_str) >= 10 and date_str[4] == '-':
+        try:
+            dt = datetime.fromisoformat(date_str)
+        except ValueError:
+            pass
+        else:
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return dt.astimezone(timezone.utc)
+
+    for fmt in DATE_FORMATS:
         try:
             dt = datetime.strptime(date_str, fmt)
             if dt.tzinfo is None:
@@ -106,9 +195,14 @@ def _parse_date(date_str):
             continue
 
     # Last attempt: if it's numeric timestamp (seconds or milliseconds)
+    return _parse_timestamp(date_str)
+
+
+def _parse_timestamp(value):
+    """Epoch seconds (or milliseconds when > 1e12) to a UTC datetime, else None."""
     try:
         # Accept ints/floats as seconds since epoch or ms as >1e12
-        ts = float(date_str)
+        ts = float(value)
         if ts > 1e12:  # milliseconds
             ts = ts / 1000.0
         return datetime.fromtimestamp(ts, tz=timezone.utc)
@@ -118,39 +212,17 @@ def _parse_date(date_str):
     # Couldn't parse
     return None
 
-# -----------------------------
-# Helper: exponential backoff for rate-limited Groq calls
-# -----------------------------
-def safe_summarize_thread(source, contact_email, thread_id, thread_obj=None, max_retries=5):
-    delay = 2
-    for attempt in range(1, max_retries + 1):
-        try:
-            return summarize_thread_logic(source, contact_email, thread_id, thread_obj=thread_obj, force=False)
-        except Exception as e:
-            msg = str(e)
-            if "rate_limit" in msg.lower() or "429" in msg:
-                print(f"⚠️ Groq rate limit hit for {thread_id}, retrying in {delay}s (attempt {attempt})")
-                time.sleep(delay)
-                delay *= 2  # exponential backoff
-            else:
-                print(f"[ERROR] Failed summarizing thread {thread_id}: {msg}")
-                return {"error": msg}
-    return {"error": f"Max retries exceeded for {thread_id}"}
-
-
 
 def process_calendar_events(summary: dict, cache: dict) -> None:
     """Process calendar events from email summary."""
+    global _calendar_client
     try:
-        print("\n🔍 Processing email for calendar events...")
-
-        # Initialize calendar client
-        calendar = GoogleCalendar()
+        logger.debug("🔍 Processing email for calendar events...")
 
         # Get the most recent message in the thread
         threads = summary.get('threads', [])
         if not threads:
-            print("  ℹ️ No threads found in summary")
+            logger.debug("ℹ️ No threads found in summary")
             return
 
         latest_message = threads[0]
@@ -164,19 +236,30 @@ def process_calendar_events(summary: dict, cache: dict) -> None:
         )
 
         if not body:
-            print("  ⚠️ No message body found in email")
+            logger.debug("⚠️ No message body found in email")
+            return
+
+        logger.debug("📧 Processing email with subject: %.50s...", subject)
+        logger.debug("📝 Body preview: %.100s...", body)
+
+        # Cheap keyword gate before touching the calendar client or regexes
+        body_lower = body.lower()
+        if not any(keyword in body_lower for keyword in MEETING_KEYWORDS):
+            logger.debug("ℹ️ No meeting keywords in email")
             return
 
-        print(f"  📧 Processing email with subject: {subject[:50]}...")
-        print(f"  📝 Body preview: {body[:100]}...")
+        # Initialize calendar client once and reuse it for every email
+        if _calendar_client is None:
+            _calendar_client = GoogleCalendar()
+        calendar = _calendar_client
 
         # Extract meeting info from email body
         meeting_info = calendar.extract_meeting_info(body)
         if not meeting_info:
-            print("  ℹ️ No meeting information found in email")
+            logger.debug("ℹ️ No meeting information found in email")
             return
 
-        print(f"  ✅ Found meeting info: {meeting_info}")
+        logger.info("✅ Found meeting info: %s", meeting_info)
 
         # Deduplication key
         source = summary.get('source', 'unknown')
@@ -184,22 +267,24 @@ def process_calendar_events(summary: dict, cache: dict) -> None:
         start_time = meeting_info.get('start_time')
 
         if not all([source, thread_id, start_time]):
-            missing = [f for f, v in zip(['source','thread_id','start_time'], [source,thread_id,start_time]) if not v]
-            print(f"  ⚠️ Missing required fields: {', '.join(missing)}")
+            missing = [f for f, v in zip(EVENT_KEY_FIELDS, (source, thread_id, start_time)) if not v]
+            logger.warning("⚠️ Missing required fields: %s", ', '.join(missing))
             return
 
         event_key = f"{source}:{thread_id}:{start_time}"
 
         # Ensure cache structures exist
         cache.setdefault('calendar_events', {})
-        cache.setdefault('processed_emails', set())
+        cache.setdefault('processed_emails', {})
 
         # Skip if event already exists
         if event_key in cache['calendar_events']:
-            print(f"  ℹ️ Calendar event already exists in cache for: {subject}")
+            logger.info("ℹ️ Calendar event already exists in cache for: %s", subject)
             return
 
         # Create event
+        if EVENT_DESCRIPTION_MAX_BODY > 0:
+            body = body[:EVENT_DESCRIPTION_MAX_BODY]
         event_data = {
             'summary': meeting_info.get('summary', subject[:100]),
             'description': f"Event created from email:\n\n{subject}\n\n{body}",
@@ -210,33 +295,32 @@ def process_calendar_events(summary: dict, cache: dict) -> None:
         result = calendar.create_event(event_data)
 
         if result.get('success'):
-            print(f"\n✅ Successfully created calendar event: {subject}")
+            logger.info("✅ Successfully created calendar event: %s", subject)
             if 'html_link' in result:
-                print(f"   🔗 {result['html_link']}")
+                logger.info("🔗 %s", result['html_link'])
 
             # Add to cache immediately
+            now_iso = datetime.now(timezone.utc).isoformat()
             cache['calendar_events'][event_key] = {
-                'created_at': datetime.now(timezone.utc).isoformat(),
+                'created_at': now_iso,
                 'subject': subject,
                 'start_time': start_time,
                 'email_thread_id': thread_id,
                 'email_subject': subject,
-                'processed_at': datetime.now(timezone.utc).isoformat()
+                'processed_at': now_iso
             }
 
             # Save immediately after adding
             save_cache(cache)
-            print(f"  💾 Saved event to cache with key: {event_key}")
+            logger.debug("💾 Saved event to cache with key: %s", event_key)
 
         else:
-            print(f"\n❌ Failed to create calendar event. Error: {result.get('error', 'Unknown error')}")
+            logger.error("❌ Failed to create calendar event. Error: %s", result.get('error', 'Unknown error'))
             if 'details' in result:
-                print(f"  Details: {result['details']}")
+                logger.error("Details: %s", result['details'])
 
     except Exception as e:
-        print(f"⚠️ Error processing calendar event: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("⚠️ Error processing calendar event: %s", e)
 
 
 
@@ -250,103 +334,149 @@ def run_unified_agent():
 
     # Ensure cache structures exist
     cache.setdefault('calendar_events', {})
-    cache.setdefault('processed_emails', set())
-    cache.setdefault('seen', {'gmail': set(), 'outlook': set()})
-
-    # Ensure processed_emails is a set
-    if isinstance(cache['processed_emails'], list):
-        cache['processed_emails'] = set(cache['processed_emails'])
-    elif not isinstance(cache['processed_emails'], set):
-        cache['processed_emails'] = set()
-
-    print(f"ℹ️ Loaded {len(cache['processed_emails'])} processed emails from cache")
-    print(f"ℹ️ Loaded {len(cache.get('calendar_events', {}))} calendar events from cache")
+    cache.setdefault('processed_emails', {})
+    cache.setdefault('seen', {'gmail': {}, 'outlook': {}})
+
+    # Ensure processed_emails is an insertion-ordered dict (message_id -> None)
+    if isinstance(cache['processed_emails'], (list, set)):
+        cache['processed_emails'] = dict.fromkeys(cache['processed_emails'])
+    elif not isinstance(cache['processed_emails'], dict):
+        cache['processed_emails'] = {}
+    _trim_oldest(cache['processed_emails'], PROCESSED_EMAILS_MAX)
+    _trim_oldest(cache['calendar_events'], CALENDAR_EVENTS_MAX)
+
+    logger.info("ℹ️ Loaded %d processed emails from cache", len(cache['processed_emails']))
+    logger.info("ℹ️ Loaded %d calendar events from cache", len(cache.get('calendar_events', {})))
+
+    # Contacts whose summaries changed since the last successful Sheets push.
+    # Start with everything so the first cycle brings the sheet in line with the cache.
+    dirty_keys = set(cache["summaries"])
+    poll_interval = POLL_INTERVAL
+    last_cleanup = time.monotonic()  # the summarizer already cleaned up on init
 
     while True:
-        print("\n============================")
-        print("🤖 Unified Email Summarizer Running")
-        print("============================")
+        logger.info("🤖 Unified Email Summarizer Running")
+
+        if time.monotonic() - last_cleanup >= CLEANUP_INTERVAL_SEC:
+            try:
+                provider.summarizer._cleanup_expired_cache()
+            except Exception as e:
+                logger.exception("⚠️ Summary cache cleanup failed: %s", e)
+            last_cleanup = time.monotonic()
 
         try:
             new_summaries = provider.get_summaries(limit=20, existing_cache=cache)
 
             if not new_summaries:
-                print("ℹ️ No new emails to process")
-                time.sleep(10)
+                poll_interval = min(poll_interval * 2, POLL_MAX_INTERVAL)
+                logger.info("ℹ️ No new emails to process — next check in %ds", poll_interval)
+                time.sleep(poll_interval)
                 continue
 
-            print(f"\n📨 Found {len(new_summaries)} new email(s) to process")
+            logger.info("📨 Found %d new email(s) to process", len(new_summaries))
 
+            processed = cache['processed_emails']
+            newly_processed = 0
             for summary in new_summaries:
                 thread_id = summary.get('id')
                 if not thread_id:
-                    print("⚠️ Skipping email with no thread ID")
+                    logger.warning("⚠️ Skipping email with no thread ID")
                     continue
 
                 # Get the latest message ID from the thread
-                latest_message = summary.get('threads', [{}])[0] if summary.get('threads') else {}
+                threads = summary.get('threads')
+                latest_message = threads[0] if threads else {}
                 message_id = latest_message.get('message_id') or latest_message.get('id')
                 
                 if not message_id:
-                    print(f"⚠️ Skipping email with no message ID (Thread ID: {thread_id})")
+                    logger.warning("⚠️ Skipping email with no message ID (Thread ID: %s)", thread_id)
                     continue
 
-                if message_id in cache.get('processed_emails', set()):
-                    print(f"ℹ️ Skipping already processed email (Message ID: {message_id})")
+                if message_id in processed:
+                    # get_summaries returns every cached contact each cycle, so
+                    # the same IDs come back; re-insert so IDs still being seen
+                    # stay newest and the trim only drops ones no longer returned
+                    processed[message_id] = processed.pop(message_id)
+                    logger.debug("ℹ️ Skipping already processed email (Message ID: %s)", message_id)
                     continue
 
                 subject = summary.get('subject', 'No subject')
-                print(f"\n📧 Processing new email: {subject} (Message ID: {message_id})")
+                logger.info("📧 Processing new email: %s (Message ID: %s)", subject, message_id)
 
                 try:
                     process_calendar_events(summary, cache)
 
-                    # Mark this specific message as processed using message_id
-                    cache['processed_emails'].add(message_id)
-                    save_cache(cache)
-                    print(f"✅ Marked email as processed (Message ID: {message_id})")
+                    # Mark this specific message as processed using message_id.
+                    # Persisted by the end-of-cycle save; created events are
+                    # saved immediately, so a crash only re-checks these emails.
+                    processed[message_id] = None
+                    newly_processed += 1
+                    logger.debug("✅ Marked email as processed (Message ID: %s)", message_id)
 
                 except Exception as e:
-                    print(f"⚠️ Error processing calendar events for email: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    print(f"⚠️ Email will be retried in the next cycle (Message ID: {message_id})")
+                    logger.exception("⚠️ Error processing calendar events for email: %s", e)
+                    logger.warning("⚠️ Email will be retried in the next cycle (Message ID: %s)", message_id)
 
         except Exception as e:
-            print(f"[ERROR] Failed to fetch summaries: {e}")
-            time.sleep(10)
+            logger.error("[ERROR] Failed to fetch summaries: %s", e)
+            time.sleep(poll_interval)
             continue
 
         # Merge new summaries into cache
-        for s in new_summaries:
-            source = s.get("source", "unknown")
-            email = s.get("email", "unknown")
-            key = f"{source}:{email}"
-
-            cache["summaries"][key] = s
-            thread_id = s.get("id")
-            if thread_id:
-                cache['seen'].setdefault(source, set())
-                cache['seen'][source].add(thread_id)
+        summaries = cache["summaries"]
+        incoming = {f"{s.get('source', 'unknown')}:{s.get('email', 'unknown')}": s for s in new_summaries}
+        changed = {k: s for k, s in incoming.items() if summaries.get(k) != s}
+        summaries.update(changed)
+        dirty_keys.update(changed)
 
+        seen_ids = defaultdict(list)
+        for s in new_summaries:
+            if s.get("id"):
+                seen_ids[s.get("source", "unknown")].append(s["id"])
+        for source, ids in seen_ids.items():
+            seen = cache['seen'].setdefault(source, {})
+            for thread_id in ids:
+                seen.pop(thread_id, None)  # re-insert so active threads stay newest
+                seen[thread_id] = None
+            _trim_oldest(seen, SEEN_THREADS_MAX)
+
+        _trim_oldest(cache['processed_emails'], PROCESSED_EMAILS_MAX)
+        _trim_oldest(cache['calendar_events'], CALENDAR_EVENTS_MAX)
         cache["last_updated"] = datetime.now(timezone.utc).isoformat()
 
         # Save cache after merging summaries
         save_cache(cache)
 
-        # Push to Google Sheets
-        try:
-            print("⬆️  Syncing cached summaries to Google Sheets...")
-            push_cached_summaries_to_sheets(cache["summaries"])
-            print("✅ Google Sheets updated successfully.")
-        except Exception as e:
-            print(f"[ERROR] Failed to sync to Google Sheets: {e}")
+        # Push only the contacts that changed to Google Sheets
+        if dirty_keys:
+            try:
+                logger.info("⬆️  Syncing %d changed summaries to Google Sheets...", len(dirty_keys))
+                to_push = {k: cache["summaries"][k] for k in dirty_keys if k in cache["summaries"]}
+                if push_cached_summaries_to_sheets(to_push):
+                    dirty_keys.clear()
+                    logger.info("✅ Google Sheets updated successfully.")
+            except Exception as e:
+                logger.error("[ERROR] Failed to sync to Google Sheets: %s", e)
+        else:
+            logger.info("ℹ️ No summary changes — Google Sheets sync skipped.")
+
+        logger.info("📊 Cycle Summary: %d contacts processed", len(new_summaries))
+        logger.info("Last updated: %s", cache["last_updated"])
 
-        print(f"📊 Cycle Summary: {len(new_summaries)} contacts processed")
-        print(f"Last updated: {datetime.now(timezone.utc).isoformat()}")
-        print("\n💤 Sleeping for 10 seconds...\n")
-        time.sleep(10)
+        # Any new mail resets the interval; idle cycles stretch it
+        if changed or newly_processed:
+            poll_interval = POLL_INTERVAL
+        else:
+            poll_interval = min(poll_interval * 2, POLL_MAX_INTERVAL)
+        logger.debug("💤 Sleeping for %d seconds...", poll_interval)
+        time.sleep(poll_interval)
 
 
 if __name__ == "__main__":
+    # force=True: integrations.google_calendar already called basicConfig at import
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(message)s",
+        force=True,
+    )
     run_unified_agent()
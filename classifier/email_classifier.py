@@ -1,12 +1,84 @@
 import re
+from functools import lru_cache
 
+try:
+    import ahocorasick  # optional: pip install pyahocorasick
+except ImportError:
+    ahocorasick = None
 
 
-def _count_keywords(text, keywords):
-    return sum(
-        1 for kw in keywords
-        if re.search(rf"\b{re.escape(kw)}\b", text)
-    )
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _compile_keywords(keyword_map):
+    """Per category: the single-word keywords as a set to intersect with the
+    text's tokens, and for the rest (phrases, "gov.pk", "info@") one alternation
+    that rules them all in or out plus a compiled pattern per keyword."""
+    compiled = []
+    for keywords in keyword_map.values():
+        words = frozenset(kw for kw in keywords if _WORD_RE.fullmatch(kw))
+        phrases = [kw for kw in keywords if kw not in words]
+        escaped = sorted(map(re.escape, phrases), key=len, reverse=True)
+        gate = re.compile(r"\b(?:" + "|".join(escaped) + r")\b") if phrases else None
+        compiled.append((words, gate, [re.compile(rf"\b{re.escape(kw)}\b") for kw in phrases]))
+    return compiled
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+def _at_word_boundary(text, start, end, kw):
+    """Same test as re's \\b on both sides of the match text[start:end + 1]."""
+    before = start > 0 and _is_word_char(text[start - 1])
+    after = end + 1 < len(text) and _is_word_char(text[end + 1])
+    return before != _is_word_char(kw[0]) and after != _is_word_char(kw[-1])
+
+
+def _build_automaton(keyword_map):
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for category, keywords in enumerate(keyword_map.values()):
+        for kw in keywords:
+            # A keyword can belong to several categories ("university", "offer")
+            _, categories = automaton.get(kw, (kw, []))
+            categories.append(category)
+            automaton.add_word(kw, (kw, categories))
+    automaton.make_automaton()
+    return automaton
+
+
+def _score_keywords(text, keyword_map, automaton, patterns):
+    """Count matched keywords per category, scanning the text once.
+
+    Returns a list of counts in keyword_map's category order.
+    """
+    if automaton is None:
+        # An all-\w keyword matches \bkw\b exactly when it is one of the
+        # text's \w+ tokens. Overlapping phrases ("exam" / "final exam") both
+        # count, so a single findall would undercount; the alternation only
+        # skips categories with no phrase present.
+        tokens = set(_WORD_RE.findall(text))
+        return [
+            len(tokens & words) + (
+                sum(1 for p in phrase_patterns if p.search(text))
+                if gate is not None and gate.search(text) else 0
+            )
+            for words, gate, phrase_patterns in patterns
+        ]
+
+    scores = [0] * len(keyword_map)
+    matched = set()
+    for end, (kw, categories) in automaton.iter(text):
+        if kw in matched or not _at_word_boundary(text, end - len(kw) + 1, end, kw):
+            continue
+        # Like the per-keyword regex, a keyword counts once however often it appears
+        matched.add(kw)
+        for category in categories:
+            scores[category] += 1
+    return scores
 
 # -----------------------------------------------------
 # 🔹 ROLE CLASSIFICATION ENHANCED DICTIONARY (EXPANDED)
@@ -118,95 +190,122 @@ DOMAIN_HINTS = {
     "General External": ["@gmail.", "@yahoo.", "@outlook.", "@hotmail."]
 }
 
+# -----------------------------------------------------
+# 🔹 ROLE PRIORITY (TIE-BREAK ORDER)
+# -----------------------------------------------------
+ROLE_PRIORITY = (
+    "Admin",
+    "Faculty",
+    "Student",
+    "Industry",
+    "External Academic",
+    "Government / Organization",
+    "General External",
+)
+
+# -----------------------------------------------------
+# 🔹 SENDER-NAME OVERRIDES (STRONG WEIGHT)
+# -----------------------------------------------------
+SENDER_OVERRIDES = {
+    "Admin": ("office", "registrar", "admissions", "admin", "hr", "finance"),
+    "Faculty": ("prof", "dr.", "lecturer", "faculty"),
+    "Student": ("student", "roll", "reg no"),
+    "Industry": ("hr", "recruit", "talent", "company"),
+    "Government / Organization": ("ministry", "department", "authority"),
+}
+
+# Scores are kept in lists indexed by category position rather than dicts
+# keyed by name; these tables translate the name-keyed settings once.
+ROLE_NAMES = tuple(ROLE_KEYWORDS)
+IMPORTANCE_LEVELS = tuple(IMPORTANCE_KEYWORDS)
+_ROLE_PRIORITY_IDX = tuple(ROLE_NAMES.index(role) for role in ROLE_PRIORITY)
+_SENDER_OVERRIDES_IDX = tuple((ROLE_NAMES.index(role), signals) for role, signals in SENDER_OVERRIDES.items())
+_DOMAIN_HINTS_IDX = tuple((ROLE_NAMES.index(role), domains) for role, domains in DOMAIN_HINTS.items())
+_HIGH_IDX = IMPORTANCE_LEVELS.index("High")
+
+# Explicit urgency markers: an extra bump for "High" on top of keyword hits
+URGENCY_RE = re.compile(r"\b(?:asap|urgent|deadline|today|immediately|within 24 hours)\b")
+
+
+# One automaton per dictionary: every keyword is found in a single pass over
+# the email instead of one regex search per keyword. Without pyahocorasick the
+# automaton is None and the precompiled regexes are used instead. Both are built
+# on first use rather than at import, so processes that import this module but
+# rarely classify (the dashboard, via GroqSummarizer) start without them.
+@lru_cache(maxsize=None)
+def _matchers(bucket):
+    keyword_map = ROLE_KEYWORDS if bucket == "role" else IMPORTANCE_KEYWORDS
+    automaton = _build_automaton(keyword_map)
+    patterns = _compile_keywords(keyword_map) if automaton is None else None
+    return keyword_map, automaton, patterns
+
 
 # -----------------------------------------------------
 # 🔹 CLASSIFICATION LOGIC
 # -----------------------------------------------------
 def classify_role(email_text, sender_email):
-    text = email_text.lower()
-    sender = sender_email.lower()
-
-    scores = {role: 0 for role in ROLE_KEYWORDS}
-
-    # 1️⃣ Keyword scoring (moderate weight)
-    for role, keywords in ROLE_KEYWORDS.items():
-        scores[role] += _count_keywords(text, keywords) * 2
-
-    # 2️⃣ Sender-name overrides (VERY STRONG)
-    sender_overrides = {
-        "Admin": ["office", "registrar", "admissions", "admin", "hr", "finance"],
-        "Faculty": ["prof", "dr.", "lecturer", "faculty"],
-        "Student": ["student", "roll", "reg no"],
-        "Industry": ["hr", "recruit", "talent", "company"],
-        "Government / Organization": ["ministry", "department", "authority"],
-    }
+    return _classify_role_lower(email_text.lower(), sender_email.lower())
 
-    for role, signals in sender_overrides.items():
-        for s in signals:
-            if s in sender:
-                scores[role] += 6  # override-level weight
+
+def _classify_role_lower(text, sender):
+    """classify_role for text and sender that are already lower-cased."""
+    # 1️⃣ Keyword scoring (moderate weight); scores are indexed like ROLE_NAMES
+    scores = [hits * 2 for hits in _score_keywords(text, *_matchers("role"))]
+
+    # 2️⃣ Sender-name overrides (VERY STRONG): every matching signal counts
+    for idx, signals in _SENDER_OVERRIDES_IDX:
+        scores[idx] += 6 * sum(s in sender for s in signals)  # override-level weight
 
     # 3️⃣ Domain hints (light weight, conflict-safe)
-    for role, domains in DOMAIN_HINTS.items():
-        for d in domains:
-            if d in sender:
-                scores[role] += 1
-
-    # 4️⃣ Priority resolution (important!)
-    priority = [
-        "Admin",
-        "Faculty",
-        "Student",
-        "Industry",
-        "External Academic",
-        "Government / Organization",
-        "General External",
-    ]
+    for idx, domains in _DOMAIN_HINTS_IDX:
+        scores[idx] += sum(d in sender for d in domains)
 
-    best_score = max(scores.values())
-    if best_score == 0:
-        return "General External", 0.4
+    # 4️⃣ Priority resolution (important!): walking roles in priority order
+    # and only taking strictly higher scores resolves ties by priority
+    best_idx, best_score = None, 0
+    for idx in _ROLE_PRIORITY_IDX:
+        if scores[idx] > best_score:
+            best_idx, best_score = idx, scores[idx]
 
-    # Resolve ties by priority
-    candidates = [r for r, s in scores.items() if s == best_score]
-    for p in priority:
-        if p in candidates:
-            best_role = p
-            break
+    if best_idx is None:
+        return "General External", 0.4
 
     confidence = min(best_score / 8, 0.95)
 
-    return best_role, round(confidence, 3)
+    return ROLE_NAMES[best_idx], round(confidence, 3)
 
 
 
 def classify_importance(email_text):
-    text = email_text.lower()
-    scores = {lvl: 0 for lvl in IMPORTANCE_KEYWORDS}
+    return _classify_importance_lower(email_text.lower())
 
-    for level, keywords in IMPORTANCE_KEYWORDS.items():
-        scores[level] += _count_keywords(text, keywords) * 2
+
+def _classify_importance_lower(text):
+    """classify_importance for text that is already lower-cased."""
+    # Scores are indexed like IMPORTANCE_LEVELS
+    scores = [hits * 2 for hits in _score_keywords(text, *_matchers("importance"))]
 
     # Explicit urgency detection
-    if re.search(r"\b(asap|urgent|deadline|today|immediately|within 24 hours)\b", text):
-        scores["High"] += 4
+    if URGENCY_RE.search(text):
+        scores[_HIGH_IDX] += 4
+
+    # First level with the highest score, in one pass
+    best_idx, best_score = None, 0
+    for idx, score in enumerate(scores):
+        if score > best_score:
+            best_idx, best_score = idx, score
 
-    best_score = max(scores.values())
-    if best_score == 0:
+    if best_idx is None:
         return "Medium", 0.4
 
-    best_level = max(scores, key=scores.get)
     confidence = min(best_score / 6, 0.95)
 
-    return best_level, round(confidence, 3)
+    return IMPORTANCE_LEVELS[best_idx], round(confidence, 3)
 
 
 
 def classify_email(sender, subject, body):
-    email_text = f"From: {sender}\nSubject: {subject}\nBody: {body}"
-
-    role, role_conf = classify_role(email_text, sender)
-    imp, imp_conf = classify_importance(email_text)
+    role, role_conf, imp, imp_conf = _classify_email_cached(sender, subject, body)
 
     return {
         "role": role,
@@ -214,3 +313,24 @@ def classify_email(sender, subject, body):
         "importance": imp,
         "importance_confidence": imp_conf,
     }
+
+
+def classify_emails(emails):
+    """classify_email over a batch of (sender, subject, body) tuples, in order.
+
+    Messages repeated within the batch (or seen recently) are scored once.
+    """
+    return [classify_email(sender, subject, body) for sender, subject, body in emails]
+
+
+# Classification is a pure function of the message, and the same messages are
+# re-classified by the provider and the summarizer on every cycle.
+@lru_cache(maxsize=2048)
+def _classify_email_cached(sender, subject, body):
+    # No "From:"/"Subject:"/"Body:" labels: no keyword matches them, and
+    # lower-case once for both classifiers instead of once in each
+    text = f"{sender}\n{subject}\n{body}".lower()
+    role, role_conf = _classify_role_lower(text, sender.lower())
+    imp, imp_conf = _classify_importance_lower(text)
+
+    return role, role_conf, imp, imp_conf
@@ -1,38 +1,98 @@
-from typing import Dict
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi import Body
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter
 from pathlib import Path
 from urllib.parse import quote
 import json
 from integrations.google_sheets import read_all_summaries
-from Summarizer.groq_summarizer import GroqSummarizer
+from Summarizer.summarize_helper import get_summarizer
 from Gmail.gmail_connector import GmailConnector
 from Outlook.outlook_connector import OutlookConnector
 from providers.reply_queue import ReplyQueue
 from providers.sent_store import SentStore
 from urllib.parse import unquote
-from providers.utils import extract_email, normalize_contact_id, expand_possible_ids
+from providers.utils import extract_email, normalize_contact_id, expand_possible_ids, json_load_file
 SUMMARY_CACHE_PATH = Path("Summaries/summaries_cache.json")
 
+try:
+    import orjson  # optional: C JSON encoder for the larger API responses
+except ImportError:
+    orjson = None
 
+# ORJSONResponse needs orjson installed; fall back to the stdlib encoder
+FAST_JSON_RESPONSE = ORJSONResponse if orjson is not None else JSONResponse
 
-app = FastAPI(title="Email Assistant Dashboard")
 
+# Threads for asyncio.to_thread (Sheets reads and other blocking I/O). The
+# asyncio default of min(32, cpu_count + 4) queues bursts of slow Sheets calls.
+IO_WORKERS = int(os.getenv("DASHBOARD_IO_WORKERS", "64"))
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+    asyncio.get_running_loop().set_default_executor(executor)
+    yield
+    executor.shutdown(wait=False)
+
+
+# Dict-returning endpoints (summaries, drafts, sent items) are encoded with orjson when available
+app = FastAPI(
+    title="Email Assistant Dashboard",
+    default_response_class=FAST_JSON_RESPONSE,
+    lifespan=_lifespan,
+)
+
+# Compiled templates are kept on disk (per-user temp dir) so restarts and other
+# workers skip compilation; auto_reload is off, so restart after editing templates.
 env = Environment(
     loader=FileSystemLoader("templates"),
     autoescape=select_autoescape(["html", "xml"]),
+    bytecode_cache=FileSystemBytecodeCache(),
+    auto_reload=False,
 )
+DASHBOARD_TEMPLATE = env.get_template("dashboard.html")
+CONTACT_TEMPLATE = env.get_template("contact_detail.html")
+THREAD_TEMPLATE = env.get_template("thread_detail.html")
+SENT_TEMPLATE = env.get_template("sent.html")
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 reply_queue = ReplyQueue()
 sent_store = SentStore()
-gmail_client = GmailConnector()
-outlook_client = OutlookConnector()
-groq_client = GroqSummarizer()
+# Built once per process, on first use: each connector authenticates (and Gmail
+# builds its discovery client) in its constructor, so handlers must reuse these
+# rather than constructing their own, and workers that only serve the listings
+# never pay for it. First use may block, so call these from worker threads.
+@lru_cache(maxsize=1)
+def _gmail() -> GmailConnector:
+    return GmailConnector()
+
+
+@lru_cache(maxsize=1)
+def _outlook() -> OutlookConnector:
+    return OutlookConnector()
+
+
+def _groq():
+    # One GroqSummarizer (and cache) per process, shared with the summarizer helpers
+    return get_summarizer()
+
+
+# The Gmail service rides on one httplib2.Http, which is not thread-safe; any
+# call made from a worker thread (or while one may be running) holds this.
+_gmail_lock = threading.Lock()
 
 
 ROLE_TO_CLASS = {
@@ -86,42 +146,74 @@ Warm regards,
 }
 
 
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+_PKT = timezone(timedelta(hours=5), name="PKT")
+
+
 def format_pkt(date_str: str) -> str:
     """Convert ISO date or UNIX timestamp to 'DD Mon YYYY, hh:mm AM/PM (PKT)' on server."""
     if not date_str:
         return ""
+    if not isinstance(date_str, (str, int, float)):
+        # Unhashable/odd values can't be cache keys; they never parsed anyway
+        return str(date_str)
+    return _format_pkt_cached(date_str)
+
+
+# The same timestamps are formatted for every row on every page load
+@lru_cache(maxsize=4096)
+def _format_pkt_cached(date_str) -> str:
     try:
-        # Handle UNIX timestamp
-        if isinstance(date_str, (int, float)) or date_str.isdigit():
-            d = datetime.fromtimestamp(float(date_str), tz=timezone.utc)
+        # Handle UNIX timestamp: numbers directly, strings only if all digits
+        if isinstance(date_str, (int, float)):
+            pkt = datetime.fromtimestamp(date_str, _PKT)
+        elif date_str.isdigit():
+            pkt = datetime.fromtimestamp(int(date_str), _PKT)
         else:
             asISO = date_str if (date_str.endswith('Z') or ('+' in date_str)) else date_str + 'Z'
-            d = datetime.fromisoformat(asISO.replace('Z', '+00:00'))
-
-        pkt = d.astimezone(timezone.utc) + timedelta(hours=5)
-        mo = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"][pkt.month-1]
-        day = f"{pkt.day:02d}"
-        h24 = pkt.hour
-        ampm = 'PM' if h24 >= 12 else 'AM'
-        h12 = h24 % 12 or 12
-        return f"{day} {mo} {pkt.year}, {h12:02d}:{pkt.minute:02d} {ampm} (PKT)"
+            pkt = datetime.fromisoformat(asISO.replace('Z', '+00:00')).astimezone(_PKT)
+        # Month name and AM/PM are filled in here rather than with %b/%p,
+        # which follow the process locale
+        ampm = 'PM' if pkt.hour >= 12 else 'AM'
+        return pkt.strftime(f"%d {_MONTHS[pkt.month - 1]} %Y, %I:%M {ampm} (PKT)")
     except Exception:
         return str(date_str)
 
 
-def _load_cached_summaries() -> dict:
-    """Read the local summaries cache for contact drilldowns."""
-    if not SUMMARY_CACHE_PATH.exists():
-        return {}
+# Parsed summaries cache file, reused until its (mtime_ns, size) changes.
+# "val" holds (raw summaries, normalized contacts) and is swapped in one go.
+_SUM_CACHE = {"key": None, "val": ({}, {})}
+
 
+def _read_summary_cache():
+    """Return (raw summaries, normalized contacts), re-parsing only when the file changes."""
     try:
-        with SUMMARY_CACHE_PATH.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+        st = SUMMARY_CACHE_PATH.stat()
+    except OSError:
+        return {}, {}
+    key = (st.st_mtime_ns, st.st_size)
+    if key == _SUM_CACHE["key"]:
+        return _SUM_CACHE["val"]
+
+    try:
+        data = json_load_file(SUMMARY_CACHE_PATH)
     except Exception as exc:
         print(f"[Cache] Error reading {SUMMARY_CACHE_PATH}: {exc}")
-        return {}
+        return {}, {}
 
     summaries = data.get("summaries", data)
+    val = (summaries, _map_summaries(summaries))
+    _SUM_CACHE["val"] = val
+    _SUM_CACHE["key"] = key
+    return val
+
+
+def _load_cached_summaries() -> dict:
+    """Read the local summaries cache for contact drilldowns."""
+    return _read_summary_cache()[1]
+
+
+def _map_summaries(summaries) -> dict:
     mapped = {}
     iterable = []
     if isinstance(summaries, dict):
@@ -147,18 +239,37 @@ def _load_cached_summaries() -> dict:
             continue
         entry["id"] = norm_id
         entry["email"] = email or entry.get("email", "")
+        # thread_id -> thread, so handlers look threads up without scanning
+        threads_by_id = {}
+        for t in entry.get("threads") or []:
+            if isinstance(t, dict):
+                threads_by_id.setdefault(t.get("thread_id") or t.get("id"), t)
+        entry["_threads_by_id"] = threads_by_id
         mapped[norm_id] = entry
     return mapped
 
+_MIN_DT = datetime.min.replace(tzinfo=timezone.utc)  # stands in for missing/bad timestamps
+
+
 def _parse_iso(value: str):
-    if not value:
-        return datetime.min.replace(tzinfo=timezone.utc)
+    if not value or not isinstance(value, str):
+        return _MIN_DT
+    return _parse_iso_cached(value)
+
+
+# Listing rows and their threads repeat the same timestamps on every request
+@lru_cache(maxsize=2048)
+def _parse_iso_cached(value: str):
+    if "Z" in value:
+        value = value[:-1] + "+00:00" if value.endswith("Z") else value.replace("Z", "+00:00")
     try:
-        return datetime.fromisoformat(value.replace("Z", "+00:00"))
-    except Exception:
-        return datetime.min.replace(tzinfo=timezone.utc)
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return _MIN_DT
 
 
+# Called for every listing row on every request, mostly with the same ids
+@lru_cache(maxsize=4096)
 def _build_detail_url(contact_id: str) -> str:
     return f"/contact/{quote(contact_id, safe='')}"
 
@@ -179,14 +290,16 @@ def _latest_thread_ts(threads_value):
     if not isinstance(threads, list):
         return ""
     latest = ""
+    latest_dt = None
     for t in threads:
         if not isinstance(t, dict):
             continue
         ts = t.get("last_message_ts") or t.get("timestamp") or t.get("date") or t.get("last_modified") or t.get("created_at")
         if not ts:
             continue
-        if not latest or _parse_iso(ts) > _parse_iso(latest):
-            latest = ts
+        ts_dt = _parse_iso(ts)
+        if not latest or ts_dt > latest_dt:
+            latest, latest_dt = ts, ts_dt
     return latest
 
 
@@ -229,12 +342,13 @@ def _format_thread_messages(messages: list, contact_email: str) -> list:
         sender_raw = msg.get("sender") or msg.get("from", "")
         sender_email = extract_email(sender_raw).lower()
         ts = _format_date(msg.get("date", "") or msg.get("receivedDateTime", ""))
+        ts_iso = ts.isoformat() if ts else None
         normalized.append({
             "sender": sender_raw,
             "subject": msg.get("subject", ""),
             "body": msg.get("body", ""),
-            "date": ts.isoformat() if ts else msg.get("date", "") or "",
-            "display_ts": format_pkt(ts.isoformat()) if ts else (msg.get("date", "") or ""),
+            "date": ts_iso or msg.get("date", "") or "",
+            "display_ts": format_pkt(ts_iso) if ts else (msg.get("date", "") or ""),
             "is_outgoing": sender_email and sender_email != contact_email,
         })
 
@@ -260,6 +374,26 @@ def _decorate_draft(draft: Dict) -> Dict:
     }
 
 
+def _fetch_gmail_thread(thread_id: str) -> list:
+    with _gmail_lock:
+        return _gmail().fetch_threads_by_id(thread_id)
+
+
+def _latest_gmail_message_id(thread_id: str):
+    with _gmail_lock:
+        thread_details = _gmail().service.users().threads().get(
+            userId="me", id=thread_id
+        ).execute()
+    if thread_details and 'messages' in thread_details and thread_details['messages']:
+        return thread_details['messages'][-1]['id']
+    return None
+
+
+def _send_gmail_email(to: str, subject: str, body: str, attachments: list):
+    with _gmail_lock:
+        _gmail().send_email(to, subject, body, attachments)
+
+
 def _send_email(source: str, thread_id: str, contact_email: str, subject: str, reply_text: str, message_id: str = None):
     """Send an email reply, maintaining thread context.
 
@@ -276,17 +410,18 @@ def _send_email(source: str, thread_id: str, contact_email: str, subject: str, r
     try:
         if source_lower == "gmail":
             # Gmail threading requires both thread_id and the latest message_id
-            gmail_client.send_reply(
-                thread_id=thread_id,
-                to_email=contact_email,
-                subject=subject,
-                reply_body=reply_text,
-                in_reply_to=message_id,  # raw message ID, do NOT wrap in <>
-                references=message_id
-            )
+            with _gmail_lock:
+                _gmail().send_reply(
+                    thread_id=thread_id,
+                    to_email=contact_email,
+                    subject=subject,
+                    reply_body=reply_text,
+                    in_reply_to=message_id,  # raw message ID, do NOT wrap in <>
+                    references=message_id
+                )
         elif source_lower == "outlook":
             # Outlook reply needs the specific message ID to reply correctly
-            outlook_client.send_reply(
+            _outlook().send_reply(
                 message_id=message_id,
                 to_email=contact_email,
                 subject=subject,
@@ -303,77 +438,54 @@ def _send_email(source: str, thread_id: str, contact_email: str, subject: str, r
         raise
 
 
-@app.get("/", response_class=HTMLResponse)
-async def dashboard(request: Request, limit: int = 20):
-    rows = read_all_summaries()  # Always display from sheets as the DB
+def _row_to_item(row: Dict):
+    """Build the listing item for a Sheets row; returns (sort timestamp, item)."""
+    email = row["email"]
+    role_value = row.get("role") or "Uncategorized"
+    date_value = _latest_thread_ts(row.get("threads")) or row.get("last_summary") or row.get("timestamp") or row.get("date") or ""
+    rid = row.get("id") or f"{row.get('source','unknown')}:{email}"
+    return _parse_iso(date_value), {
+        "id": rid,
+        "email": email,
+        "role": role_value,
+        "summary": row.get("contact_summary") or row.get("summary") or "",
+        "date": format_pkt(date_value),
+        "source": row.get("source", ""),
+        "role_class": ROLE_TO_CLASS.get(role_value, "tag-default"),
+        "importance": "",
+        "detail_url": _build_detail_url(rid),
+    }
 
-    items = []
-    for row in rows:
-        email = row.get("email")
-        if not email:
-            continue
 
-        summary_text = row.get("contact_summary") or row.get("summary") or ""
-        date_value = _latest_thread_ts(row.get("threads")) or row.get("last_summary") or row.get("timestamp") or row.get("date") or ""
-        role_value = row.get("role") or row.get("Role") or "Uncategorized"
+@app.get("/", response_class=HTMLResponse)
+async def dashboard(request: Request, limit: Optional[int] = None):
+    # Always display from sheets as the DB; the read is blocking HTTP, so keep it off the event loop
+    rows = await asyncio.to_thread(read_all_summaries, limit=limit)
 
-        parsed_ts = _parse_iso(_latest_thread_ts(row.get("threads")) or row.get("last_summary") or row.get("timestamp") or row.get("date") or "")
-        item = {
-            "id": row.get("id") or f"{row.get('source','unknown')}:{email}",
-            "email": email,
-            "role": role_value,
-            "summary": summary_text,
-            "date": format_pkt(date_value),
-            "source": row.get("source", ""),
-            "role_class": ROLE_TO_CLASS.get(role_value, "tag-default"),
-            "sort_ts": parsed_ts,
-        }
-        item["detail_url"] = _build_detail_url(item["id"])
-        items.append(item)
+    decorated = [_row_to_item(row) for row in rows if row.get("email")]
 
-    items.sort(key=lambda it: it.get("sort_ts", datetime.min.replace(tzinfo=timezone.utc)), reverse=True)
-    for it in items:
-        it.pop("sort_ts", None)
+    # Newest first; sorting on the pair's timestamp avoids a key lambda and
+    # a pass to strip the sort field back out of every item
+    decorated.sort(key=itemgetter(0), reverse=True)
+    items = [item for _, item in decorated]
 
     summary_count = len(items)
     unique_contacts = len({item["email"] for item in items})
 
-    template = env.get_template("dashboard.html")
-    html = template.render(items=items, summary_count=summary_count, unique_contacts=unique_contacts)
-    return HTMLResponse(content=html)
+    # Stream the page so the head and first rows go out while later rows render;
+    # Starlette iterates the (sync) template stream in its threadpool
+    stream = DASHBOARD_TEMPLATE.stream(items=items, summary_count=summary_count, unique_contacts=unique_contacts)
+    stream.enable_buffering(size=50)
+    return StreamingResponse(stream, media_type="text/html")
 
 
 @app.get("/api/summaries")
-async def api_summaries(limit: int = 20):
-    rows = read_all_summaries()
-
-    items = []
-    for row in rows:
-        email = row.get("email")
-        if not email:
-            continue
-
-        role_value = row.get("role") or row.get("Role") or "Uncategorized"
-        summary_text = row.get("contact_summary") or row.get("summary") or ""
-        date_value = _latest_thread_ts(row.get("threads")) or row.get("last_summary") or row.get("timestamp") or row.get("date")
-
-        parsed_ts = _parse_iso(_latest_thread_ts(row.get("threads")) or row.get("last_summary") or row.get("timestamp") or row.get("date") or "")
-        items.append({
-            "id": row.get("id") or f"{row.get('source','unknown')}:{email}",
-            "email": email,
-            "role": role_value,
-            "summary": summary_text,
-            "date": format_pkt(date_value),
-            "source": row.get("source", ""),
-            "role_class": ROLE_TO_CLASS.get(role_value, "tag-default"),
-            "importance": "",
-            "detail_url": _build_detail_url(row.get("id") or f"{row.get('source','unknown')}:{email}"),
-            "sort_ts": parsed_ts,
-        })
+async def api_summaries(limit: Optional[int] = None):
+    rows = await asyncio.to_thread(read_all_summaries, limit=limit)
 
-    items.sort(key=lambda it: it.get("sort_ts", datetime.min.replace(tzinfo=timezone.utc)), reverse=True)
-    for it in items:
-        it.pop("sort_ts", None)
+    decorated = [_row_to_item(row) for row in rows if row.get("email")]
+    decorated.sort(key=itemgetter(0), reverse=True)
+    items = [item for _, item in decorated]
     return {"ok": True, "count": len(items), "items": items}
 
 
@@ -406,10 +518,8 @@ async def contact_detail(contact_id: str):
     # Load raw cache to ensure we include any previously-stored threads
     raw_threads = []
     try:
-        if SUMMARY_CACHE_PATH.exists():
-            with SUMMARY_CACHE_PATH.open("r", encoding="utf-8") as f:
-                raw_cache = json.load(f)
-            raw_summaries = raw_cache.get("summaries", raw_cache)
+        raw_summaries = _read_summary_cache()[0]
+        if raw_summaries:
             # Try match by normalized id, or by source:email key
             raw_entry = None
             # direct id match
@@ -419,7 +529,7 @@ async def contact_detail(contact_id: str):
                 key = f"{contact_entry.get('source')}:{contact_entry.get('email')}"
                 raw_entry = raw_summaries.get(key) if isinstance(raw_summaries, dict) else None
             if raw_entry and isinstance(raw_entry.get("threads"), list):
-                raw_threads = [t for t in raw_entry.get("threads") if isinstance(t, dict)]
+                raw_threads = raw_entry["threads"]  # non-dicts are skipped by _add_thread_obj
     except Exception:
         raw_threads = []
 
@@ -433,9 +543,7 @@ async def contact_detail(contact_id: str):
             return
         threads_by_id[str(tid)] = t
 
-    for t in raw_threads:
-        _add_thread_obj(t)
-    for t in contact_entry.get("threads", []):
+    for t in chain(raw_threads, contact_entry.get("threads", [])):
         _add_thread_obj(t)
 
     for tid, thread in threads_by_id.items():
@@ -453,21 +561,22 @@ async def contact_detail(contact_id: str):
 
     threads.sort(key=lambda t: _parse_iso(t.get("timestamp")), reverse=True)
 
-    possible_ids = expand_possible_ids(contact_id)
-    drafts = []
-    for pid in possible_ids:
-        drafts.extend(reply_queue.list_drafts(contact_id=pid))
+    # list_drafts already matches every id form of the contact (expand_possible_ids),
+    # so one call - one queue read - covers them all
+    drafts = reply_queue.list_drafts(contact_id=contact_id)
     if not drafts:
         alt_id = contact_entry.get("id") or f"{source}:{email}"
         if alt_id and alt_id != contact_id:
             drafts = reply_queue.list_drafts(contact_id=alt_id)
         elif source and email and ":" not in contact_id:
             drafts = reply_queue.list_drafts(contact_id=f"{source}:{email}")
-    pending_drafts = [_decorate_draft(d) for d in drafts if d.get("status") == "pending_review"]
-    history_drafts = [_decorate_draft(d) for d in drafts if d.get("status") != "pending_review"]
+    pending_drafts, history_drafts = [], []
+    for d in drafts:
+        (pending_drafts if d.get("status") == "pending_review" else history_drafts).append(_decorate_draft(d))
 
-    template = env.get_template("contact_detail.html")
-    html = template.render(
+    # Streamed like the dashboard: contacts with long thread/draft histories
+    # start painting before the whole page is rendered
+    stream = CONTACT_TEMPLATE.stream(
         contact={
             "id": contact_id,
             "email": email,
@@ -482,7 +591,8 @@ async def contact_detail(contact_id: str):
         pending_drafts=pending_drafts,
         history_drafts=history_drafts,
     )
-    return HTMLResponse(content=html)
+    stream.enable_buffering(size=50)
+    return StreamingResponse(stream, media_type="text/html")
 
 
 @app.get("/contact/{contact_id}/thread/{thread_id}", response_class=HTMLResponse)
@@ -494,27 +604,23 @@ async def thread_detail(contact_id: str, thread_id: str):
     source = (contact_entry.get("source") or "").lower() or "gmail"
 
     # Pull thread metadata from cached threads
-    thread_meta = next(
-        (t for t in contact_entry.get("threads", []) if (t.get("thread_id") or t.get("id")) == thread_id),
-        {}
-    )
+    thread_meta = contact_entry.get("_threads_by_id", {}).get(thread_id) or {}
     subject = thread_meta.get("subject") or "(No subject)"
 
     # Fetch full messages for chat-style view
     messages = []
     try:
         if source == "gmail":
-            messages = gmail_client.fetch_threads_by_id(thread_id)
+            messages = await asyncio.to_thread(_fetch_gmail_thread, thread_id)
         elif source == "outlook":
-            messages = outlook_client.fetch_thread_by_id(contact_email, thread_id)
+            messages = await asyncio.to_thread(lambda: _outlook().fetch_thread_by_id(contact_email, thread_id))
     except Exception as exc:
         print(f"[ThreadDetail] Failed to load thread {thread_id}: {exc}")
         messages = []
 
     normalized_messages = _format_thread_messages(messages, contact_email)
 
-    template = env.get_template("thread_detail.html")
-    html = template.render(
+    html = THREAD_TEMPLATE.render(
         contact={
             "id": contact_id,
             "email": contact_email,
@@ -530,83 +636,71 @@ async def thread_detail(contact_id: str, thread_id: str):
     return HTMLResponse(content=html)
 
 
-@app.post("/api/generate-reply")
-async def generate_reply(
-    contact_id: str = Body(...),
-    thread_id: str = Body(...),
-    user_prompt: str = Body(...)
-):
-    """Generate a reply for a thread using thread summary + user prompt."""
-    try:
-        from urllib.parse import unquote
-        
-        # Decode URL-encoded contact_id
-        decoded_contact_id = unquote(contact_id)
-        
-        summaries = _load_cached_summaries()
+def _build_reply_prompt(contact_id: str, thread_id: str, user_prompt: str) -> str:
+    """Build the reply prompt from the cached thread summary; raises HTTPException."""
+    # Decode URL-encoded contact_id
+    decoded_contact_id = unquote(contact_id)
+    
+    summaries = _load_cached_summaries()
+    
+    # First try with the exact ID from the URL
+    contact_entry = summaries.get(decoded_contact_id)
+    
+    # If not found, try to find a matching contact by normalizing the ID
+    if not contact_entry and ':' in decoded_contact_id:
+        source_part, email_part = decoded_contact_id.split(':', 1)
         
-        # First try with the exact ID from the URL
-        contact_entry = summaries.get(decoded_contact_id)
+        # Try different variations of the contact ID
+        variations = [
+            decoded_contact_id,  # Original format
+            f"{source_part}:{email_part.split('<')[0].strip()}",  # Without angle brackets
+            f"{source_part}:{email_part.split('<')[-1].split('>')[0].strip()}"  # Just email part
+        ]
         
-        # If not found, try to find a matching contact by normalizing the ID
-        if not contact_entry and ':' in decoded_contact_id:
-            source_part, email_part = decoded_contact_id.split(':', 1)
+        # Try each variation until we find a match
+        for variation in variations:
+            contact_entry = summaries.get(variation)
+            if contact_entry:
+                break
+    
+    # As a last resort, try to find by email only (without source prefix)
+    if not contact_entry and ':' in decoded_contact_id:
+        _, email_part = decoded_contact_id.split(':', 1)
+        # Extract just the email if it's in <email> format
+        if '<' in email_part and '>' in email_part:
+            email = email_part.split('<')[-1].split('>')[0].strip()
+        else:
+            email = email_part.strip()
             
-            # Try different variations of the contact ID
-            variations = [
-                decoded_contact_id,  # Original format
-                f"{source_part}:{email_part.split('<')[0].strip()}",  # Without angle brackets
-                f"{source_part}:{email_part.split('<')[-1].split('>')[0].strip()}"  # Just email part
-            ]
+        # Search through all summaries for a matching email
+        for key, entry in summaries.items():
+            entry_email = None
+            # Extract email from the key if it's in the format "source:name <email>"
+            if ':' in key and '<' in key and '>' in key:
+                entry_email = key.split('<')[-1].split('>')[0].strip()
+            # Or if it's just "source:email"
+            elif ':' in key and '@' in key.split(':')[1]:
+                entry_email = key.split(':', 1)[1].strip()
             
-            # Try each variation until we find a match
-            for variation in variations:
-                contact_entry = summaries.get(variation)
-                if contact_entry:
-                    break
-        
-        # As a last resort, try to find by email only (without source prefix)
-        if not contact_entry and ':' in decoded_contact_id:
-            _, email_part = decoded_contact_id.split(':', 1)
-            # Extract just the email if it's in <email> format
-            if '<' in email_part and '>' in email_part:
-                email = email_part.split('<')[-1].split('>')[0].strip()
-            else:
-                email = email_part.strip()
-                
-            # Search through all summaries for a matching email
-            for key, entry in summaries.items():
-                entry_email = None
-                # Extract email from the key if it's in the format "source:name <email>"
-                if ':' in key and '<' in key and '>' in key:
-                    entry_email = key.split('<')[-1].split('>')[0].strip()
-                # Or if it's just "source:email"
-                elif ':' in key and '@' in key.split(':')[1]:
-                    entry_email = key.split(':', 1)[1].strip()
-                
-                # Check if emails match
-                if entry_email and entry_email.lower() == email.lower():
-                    contact_entry = entry
-                    break
-        
-        if not contact_entry:
-            raise HTTPException(status_code=404, detail=f"Contact not found: {decoded_contact_id}")
-        
-        # Find the thread
-        thread = None
-        for t in contact_entry.get("threads", []):
-            if (t.get("thread_id") or t.get("id")) == thread_id:
-                thread = t
+            # Check if emails match
+            if entry_email and entry_email.lower() == email.lower():
+                contact_entry = entry
                 break
-        
-        if not thread:
-            raise HTTPException(status_code=404, detail="Thread not found")
-        
-        thread_summary = thread.get("summary") or thread.get("body") or ""
-        if not thread_summary:
-            raise HTTPException(status_code=400, detail="Thread summary not available")
-        
-        prompt = f"""You are an email assistant helping write a professional reply.
+    
+    if not contact_entry:
+        raise HTTPException(status_code=404, detail=f"Contact not found: {decoded_contact_id}")
+    
+    # Find the thread
+    thread = contact_entry.get("_threads_by_id", {}).get(thread_id)
+    
+    if not thread:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    
+    thread_summary = thread.get("summary") or thread.get("body") or ""
+    if not thread_summary:
+        raise HTTPException(status_code=400, detail="Thread summary not available")
+    
+    prompt = f"""You are an email assistant helping write a professional reply.
 
 Thread Summary:
 {thread_summary}
@@ -616,8 +710,19 @@ User Instructions:
 
 Generate a concise, professional reply based on the thread summary and user instructions. 
 Write the reply directly (no greetings like "Here's a reply:")."""
-        
-        reply_text = groq_client._run_groq_model(prompt)
+    return prompt
+
+
+@app.post("/api/generate-reply")
+async def generate_reply(
+    contact_id: str = Body(...),
+    thread_id: str = Body(...),
+    user_prompt: str = Body(...)
+):
+    """Generate a reply for a thread using thread summary + user prompt."""
+    try:
+        prompt = _build_reply_prompt(contact_id, thread_id, user_prompt)
+        reply_text = await asyncio.to_thread(lambda: _groq()._run_groq_model(prompt))
         
         return {
             "ok": True,
@@ -629,8 +734,37 @@ Write the reply directly (no greetings like "Here's a reply:")."""
         return {"ok": False, "error": str(e)}
 
 
+@app.post("/api/generate-reply/stream")
+async def generate_reply_stream(
+    contact_id: str = Body(...),
+    thread_id: str = Body(...),
+    user_prompt: str = Body(...)
+):
+    """Same as /api/generate-reply, but streams the reply as server-sent events."""
+    try:
+        prompt = _build_reply_prompt(contact_id, thread_id, user_prompt)
+    except HTTPException as e:
+        return {"ok": False, "error": e.detail}
+
+    async def token_stream():
+        try:
+            summarizer = await asyncio.to_thread(_groq)  # the first call constructs it
+            async for chunk in summarizer._run_groq_model_stream(prompt):
+                yield f"data: {json.dumps({'token': chunk})}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            return
+        yield f"data: {json.dumps({'done': True})}\n\n"
+
+    return StreamingResponse(
+        token_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/api/drafts/save")
-async def save_draft(
+def save_draft(
     draft_id: str = Body(...),
     reply_text: str = Body(...)
 ):
@@ -651,7 +785,7 @@ async def save_draft(
 
 
 @app.post("/api/drafts/reject")
-async def reject_draft(draft_id: str = Body(...), reason: str = Body(default="Rejected by reviewer")):
+def reject_draft(draft_id: str = Body(...), reason: str = Body(default="Rejected by reviewer")):
     draft = reply_queue.get_draft(draft_id)
     if not draft:
         raise HTTPException(status_code=404, detail="Draft not found")
@@ -669,7 +803,7 @@ async def reject_draft(draft_id: str = Body(...), reason: str = Body(default="Re
 
 
 @app.post("/api/drafts/send")
-async def send_draft(payload: dict = Body(...)):
+def send_draft(payload: dict = Body(...)):
     draft_id = payload.get("draft_id", "").strip()
     if not draft_id:
         raise HTTPException(status_code=400, detail="Draft ID not provided")
@@ -691,15 +825,16 @@ async def send_draft(payload: dict = Body(...)):
         message_id=draft.get("last_message_id"),
     )
 
+    now_iso = datetime.now(timezone.utc).isoformat()
     reply_queue.update_draft(
         draft_id,
         status="sent",
         history={
             "event": "sent",
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "timestamp": now_iso,
             "note": "Draft sent after human approval",
         },
-        sent_at=datetime.now(timezone.utc).isoformat(),
+        sent_at=now_iso,
     )
 
     print(f"[DraftQueue] ✅ Draft {draft_id} sent")
@@ -759,35 +894,27 @@ async def send_reply(
         contact_email = contact_entry.get("email")
 
         # Find the thread and latest message
-        thread = None
         latest_message_id = None
         latest_subject = subject or "(no subject)"
-        for t in contact_entry.get("threads", []):
-            if (t.get("thread_id") or t.get("id")) == thread_id:
-                thread = t
-                latest_subject = t.get("subject") or latest_subject
-                # Check last_message_id field first
-                if t.get("last_message_id"):
-                    latest_message_id = t["last_message_id"]
-                # Or check messages array
-                elif t.get("messages") and len(t["messages"]) > 0:
-                    latest_message_id = t["messages"][-1].get("id")
-                # Or fallback to thread id itself (not ideal)
-                elif t.get("id"):
-                    latest_message_id = t.get("id")
-                break
+        t = contact_entry.get("_threads_by_id", {}).get(thread_id)
+        if t:
+            latest_subject = t.get("subject") or latest_subject
+            # Check last_message_id field first
+            if t.get("last_message_id"):
+                latest_message_id = t["last_message_id"]
+            # Or check messages array
+            elif t.get("messages") and len(t["messages"]) > 0:
+                latest_message_id = t["messages"][-1].get("id")
+            # Or fallback to thread id itself (not ideal)
+            elif t.get("id"):
+                latest_message_id = t.get("id")
 
         # If still not found, fetch thread details from provider
         if not latest_message_id:
             if source == "gmail":
-                thread_details = gmail_client.service.users().threads().get(
-                    userId="me", id=thread_id
-                ).execute()
-                if thread_details and 'messages' in thread_details and thread_details['messages']:
-                    latest_message_id = thread_details['messages'][-1]['id']
+                latest_message_id = await asyncio.to_thread(_latest_gmail_message_id, thread_id)
             elif source == "outlook":
-                outlook_connector = OutlookConnector()
-                messages = outlook_connector.fetch_thread_by_id(contact_email, thread_id)
+                messages = await asyncio.to_thread(lambda: _outlook().fetch_thread_by_id(contact_email, thread_id))
                 if messages:
                     latest_message_id = messages[-1]['id']
 
@@ -797,7 +924,8 @@ async def send_reply(
         print(f"[DEBUG] Sending reply to thread {thread_id}, message {latest_message_id}")
 
         # Send the reply
-        _send_email(
+        await asyncio.to_thread(
+            _send_email,
             source,
             thread_id,
             contact_email,
@@ -809,16 +937,18 @@ async def send_reply(
         # Update draft if applicable
         if draft_id:
             note = "Sent via manual review"
-            reply_queue.update_draft(
+            now_iso = datetime.now(timezone.utc).isoformat()
+            await asyncio.to_thread(
+                reply_queue.update_draft,
                 draft_id,
                 status="sent",
                 generated_reply=reply_text,
                 history={
                     "event": "sent",
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "timestamp": now_iso,
                     "note": note
                 },
-                sent_at=datetime.now(timezone.utc).isoformat(),
+                sent_at=now_iso,
             )
             print(f"[DraftQueue] 📬 Draft {draft_id} sent and marked as completed.")
 
@@ -845,12 +975,12 @@ async def compose_email(
     try:
         src = (source or "gmail").lower()
         if src == "gmail":
-            GmailConnector().send_email(to, subject, body, attachments or [])
+            await asyncio.to_thread(_send_gmail_email, to, subject, body, attachments or [])
         elif src == "outlook":
-            OutlookConnector().send_email(to, subject, body, attachments or [])
+            await asyncio.to_thread(lambda: _outlook().send_email(to, subject, body, attachments or []))
         else:
             raise HTTPException(status_code=400, detail="Unsupported source")
-        sent_store.record(to, subject, body, source=src)
+        await asyncio.to_thread(sent_store.record, to, subject, body, source=src)
         return {"ok": True}
     except Exception as e:
         return {"ok": False, "error": str(e)}
@@ -899,7 +1029,7 @@ Short instruction from user:
 Rewrite the email body clearly and concisely. Keep it ready to send."""
 
     try:
-        regenerated = groq_client._run_groq_model(instruction_prompt)
+        regenerated = await asyncio.to_thread(lambda: _groq()._run_groq_model(instruction_prompt))
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Generation failed: {exc}")
 
@@ -916,8 +1046,7 @@ Rewrite the email body clearly and concisely. Keep it ready to send."""
 @app.get("/sent", response_class=HTMLResponse)
 async def sent_view():
     sent_items = sent_store.list_sent()
-    template = env.get_template("sent.html")
-    html = template.render(items=sent_items)
+    html = SENT_TEMPLATE.render(items=sent_items)
     return HTMLResponse(content=html)
 
 
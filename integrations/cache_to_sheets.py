@@ -1,11 +1,26 @@
-import json
 import os
 from datetime import datetime, timezone
+from functools import lru_cache
 from integrations.google_sheets import upsert_summaries
+from providers.utils import json_load_file
 
 
 CACHE_PATH = "Summaries/summaries_cache.json"
 
+DATE_FORMATS = (
+    '%Y-%m-%dT%H:%M:%S%z',      # 2023-11-06T13:18:25+05:00
+    '%Y-%m-%d %H:%M:%S%z',      # 2023-11-06 13:18:25+05:00
+    '%Y-%m-%dT%H:%M:%S.%fZ',    # 2023-11-06T08:18:25.123456Z
+    '%Y-%m-%dT%H:%M:%SZ',       # 2023-11-06T08:18:25Z
+    '%Y-%m-%d %H:%M:%S',        # 2023-11-06 13:18:25
+    '%Y-%m-%d',                 # 2023-11-06
+    '%d-%m-%Y %H:%M',           # 06-11-2023 13:18
+    '%m/%d/%Y %I:%M %p',        # 11/06/2023 01:18 PM
+)
+
+# Fields probed (in order) for a thread's or entry's date
+DATE_KEYS = ('date', 'timestamp', 'last_modified', 'created_at')
+
 
 def _parse_date(date_str):
     """Parse date string to datetime object, handling multiple formats."""
@@ -15,18 +30,26 @@ def _parse_date(date_str):
     if isinstance(date_str, datetime):
         return date_str.astimezone(timezone.utc) if date_str.tzinfo else date_str.replace(tzinfo=timezone.utc)
 
-    date_formats = [
-        '%Y-%m-%dT%H:%M:%S%z',      # 2023-11-06T13:18:25+05:00
-        '%Y-%m-%d %H:%M:%S%z',      # 2023-11-06 13:18:25+05:00
-        '%Y-%m-%dT%H:%M:%S.%fZ',    # 2023-11-06T08:18:25.123456Z
-        '%Y-%m-%dT%H:%M:%SZ',       # 2023-11-06T08:18:25Z
-        '%Y-%m-%d %H:%M:%S',        # 2023-11-06 13:18:25
-        '%Y-%m-%d',                 # 2023-11-06
-        '%d-%m-%Y %H:%M',           # 06-11-2023 13:18
-        '%m/%d/%Y %I:%M %p',        # 11/06/2023 01:18 PM
-    ]
-
-    for fmt in date_formats:
+    if not isinstance(date_str, str):
+        return None
+    return _parse_date_str(date_str)
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_str(date_str):
+    """String branch of _parse_date, memoized since the same timestamps recur."""
+    # Fast path: ISO 8601 strings (the common case) parse in C, no format loop
+    if len(date_str) >= 10 and date_str[4] == '-':
+        try:
+            dt = datetime.fromisoformat(date_str)
+        except ValueError:
+            pass
+        else:
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return dt.astimezone(timezone.utc)
+
+    for fmt in DATE_FORMATS:
         try:
             dt = datetime.strptime(date_str, fmt)
             if dt.tzinfo is None:
@@ -39,21 +62,32 @@ def _parse_date(date_str):
     return None
 
 
+def _dates_in(record):
+    """Yield every parseable DATE_KEYS value of a thread/entry dict, in key order."""
+    for field in DATE_KEYS:
+        if field in record:
+            dt = _parse_date(record[field])
+            if dt:
+                yield dt
+
+
 def push_cached_summaries_to_sheets(summaries_dict=None):
-    """Push summaries cache to Google Sheets with correct last thread date."""
+    """
+    Push summaries cache to Google Sheets with correct last thread date.
+    Returns True when the sheet is in sync with the given summaries (or there was nothing to push).
+    """
 
     # Load cache if not provided
     if summaries_dict is None:
         if not os.path.exists(CACHE_PATH):
             print("[WARN] No summaries_cache.json found.")
-            return
+            return False
 
-        with open(CACHE_PATH, "r", encoding="utf-8") as f:
-            try:
-                cache_data = json.load(f)
-            except Exception as e:
-                print(f"[ERROR] Could not parse cache JSON: {e}")
-                return
+        try:
+            cache_data = json_load_file(CACHE_PATH)
+        except Exception as e:
+            print(f"[ERROR] Could not parse cache JSON: {e}")
+            return False
 
         summaries_dict = cache_data.get("summaries", cache_data)
 
@@ -62,9 +96,11 @@ def push_cached_summaries_to_sheets(summaries_dict=None):
 
     if not isinstance(summaries_list, list):
         print("[ERROR] Cache file format invalid: expected a list or dict of summaries.")
-        return
+        return False
 
     rows = []
+    # One "now" for every row that has no thread dates, instead of one per row
+    now_iso = datetime.now(timezone.utc).isoformat()
 
     for entry in summaries_list:
         if not isinstance(entry, dict):
@@ -74,29 +110,18 @@ def push_cached_summaries_to_sheets(summaries_dict=None):
         source = entry.get("source", "unknown")
         threads = entry.get("threads", [])
 
-        # Find the most recent thread date
-        latest_date = None
-        for thread in threads:
-            for field in ['date', 'timestamp', 'last_modified', 'created_at']:
-                if field in thread:
-                    dt = _parse_date(thread[field])
-                    if dt and (latest_date is None or dt > latest_date):
-                        latest_date = dt
+        # Find the most recent thread date in a single pass
+        latest_date = max((dt for thread in threads for dt in _dates_in(thread)), default=None)
 
         # If no thread dates, fallback to entry date or now
         if latest_date is None:
-            for field in ['date', 'timestamp', 'last_modified', 'created_at']:
-                if field in entry:
-                    dt = _parse_date(entry[field])
-                    if dt:
-                        latest_date = dt
-                        break
+            latest_date = next(_dates_in(entry), None)
 
         # Format the final date
         last_updated = (
             latest_date.isoformat()
             if latest_date
-            else datetime.now(timezone.utc).isoformat()
+            else now_iso
         )
 
         row = {
@@ -113,15 +138,18 @@ def push_cached_summaries_to_sheets(summaries_dict=None):
 
     if not rows:
         print("[INFO] No valid cached summaries to push.")
-        return
+        return True
 
     print(f"[INFO] Uploading {len(rows)} summaries to Google Sheets...")
     try:
-        upsert_summaries(rows)
+        if not upsert_summaries(rows):
+            return False
         print("[Sheets] ✅ Successfully pushed cache to Google Sheets.")
+        return True
     except Exception as e:
         print(f"[Sheets] ❌ Error upserting summaries: {e}")
         import traceback
         traceback.print_exc()
+        return False
 
 
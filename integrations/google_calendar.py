@@ -13,6 +13,13 @@ from googleapiclient.discovery import build
 import pickle
 import logging
 
+# Optional: RE2 matches in linear time, so hostile email bodies can't trigger
+# catastrophic backtracking. Falls back to the stdlib engine when missing.
+try:
+    import re2
+except ImportError:
+    re2 = None
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,6 +28,40 @@ logger = logging.getLogger(__name__)
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 TOKEN_PATH = 'token_calendar.pickle'
 
+
+def _compile(pattern: str):
+    """Compile with RE2 when available, else (or if RE2 rejects it) with re."""
+    if re2 is not None:
+        try:
+            return re2.compile(pattern)
+        except Exception:
+            pass
+    return re.compile(pattern)
+
+
+# Meeting-related keywords; an email needs one of these to be considered
+MEETING_KEYWORDS = (
+    'meeting', 'appointment', 'call', 'discussion', 'sync',
+    'meet', 'schedule', 'calendar', 'event', 'reminder'
+)
+
+# More comprehensive date patterns
+DATE_PATTERNS = tuple(_compile(p) for p in (
+    # MM/DD/YYYY or DD/MM/YYYY
+    r'(?i)(\b(?:0?[1-9]|1[0-2])[\/\-\.](?:0?[1-9]|[12][0-9]|3[01])[\/\-](?:\d{4}|\d{2})\b)',
+    # Month name patterns
+    r'(?i)(?:\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+\d{1,2}(?:st|nd|rd|th)?(?:\s*,\s*\d{4})?)',
+    # ISO format YYYY-MM-DD
+    r'(?i)(\d{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12][0-9]|3[01]))',
+))
+
+# Time patterns (24h and 12h formats)
+TIME_PATTERNS = tuple(_compile(p) for p in (
+    r'(?i)(\b(?:1[0-2]|0?[1-9]):[0-5][0-9]\s*(?:[AaPp][Mm])\b)',  # 12-hour with AM/PM
+    r'(?i)(\b(?:[01]?[0-9]|2[0-3]):[0-5][0-9]\b)',  # 24-hour format
+    r'(?i)(\b(?:1[0-2]|0?[1-9])\s*(?:[AaPp][Mm])\b)',  # 12-hour without minutes
+))
+
 class GoogleCalendar:
     def __init__(self, credentials_path: str = 'credentials.json'):
         """Initialize Google Calendar API client."""
@@ -130,32 +171,9 @@ class GoogleCalendar:
         Returns:
             Dict containing meeting details or None if no meeting found
         """
-        # More comprehensive date patterns
-        date_patterns = [
-            # MM/DD/YYYY or DD/MM/YYYY
-            r'(\b(?:0?[1-9]|1[0-2])[\/\-\.](?:0?[1-9]|[12][0-9]|3[01])[\/\-](?:\d{4}|\d{2})\b)',
-            # Month name patterns
-            r'(?:\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+\d{1,2}(?:st|nd|rd|th)?(?:\s*,\s*\d{4})?)',
-            # ISO format YYYY-MM-DD
-            r'(\d{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12][0-9]|3[01]))',
-        ]
-        
-        # Time patterns (24h and 12h formats)
-        time_patterns = [
-            r'(\b(?:1[0-2]|0?[1-9]):[0-5][0-9]\s*(?:[AaPp][Mm])\b)',  # 12-hour with AM/PM
-            r'(\b(?:[01]?[0-9]|2[0-3]):[0-5][0-9]\b)',  # 24-hour format
-            r'(\b(?:1[0-2]|0?[1-9])\s*(?:[AaPp][Mm])\b)',  # 12-hour without minutes
-        ]
-        
-        # Check for meeting-related keywords
-        meeting_keywords = [
-            'meeting', 'appointment', 'call', 'discussion', 'sync',
-            'meet', 'schedule', 'calendar', 'event', 'reminder'
-        ]
-        
         # If no meeting-related keywords found, return None
         email_lower = email_body.lower()
-        if not any(keyword in email_lower for keyword in meeting_keywords):
+        if not any(keyword in email_lower for keyword in MEETING_KEYWORDS):
             return None
             
         # Try to extract date and time
@@ -163,13 +181,13 @@ class GoogleCalendar:
         time_match = None
         
         # Find the first date match
-        for pattern in date_patterns:
-            matches = list(re.finditer(pattern, email_body, re.IGNORECASE))
+        for pattern in DATE_PATTERNS:
+            matches = list(pattern.finditer(email_body))
             if matches:
                 # Prefer dates that are closer to meeting-related words
                 for match in matches:
                     context = email_lower[max(0, match.start()-50):min(len(email_lower), match.end()+50)]
-                    if any(word in context for word in meeting_keywords):
+                    if any(word in context for word in MEETING_KEYWORDS):
                         date_match = match
                         break
                 if date_match:
@@ -187,8 +205,8 @@ class GoogleCalendar:
         context_end = min(len(email_body), date_match.end() + 50)
         context = email_body[context_start:context_end]
         
-        for pattern in time_patterns:
-            time_matches = list(re.finditer(pattern, context, re.IGNORECASE))
+        for pattern in TIME_PATTERNS:
+            time_matches = list(pattern.finditer(context))
             if time_matches:
                 time_match = time_matches[0]  # Take the first time found near the date
                 break
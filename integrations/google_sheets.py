@@ -1,12 +1,19 @@
 from typing import List, Dict, Optional
+import logging
 import os
 from pathlib import Path
 import gspread
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 import pickle
+import threading
+import time
 from datetime import datetime, timezone
+from functools import lru_cache
 import json
+from providers.utils import json_load_file
+
+logger = logging.getLogger(__name__)
 
 # ---------------------- CONFIG ----------------------
 SCOPES = [
@@ -30,11 +37,42 @@ HEADER = [
 ]
 
 OUT_KEYS = HEADER.copy()
+
+DATE_FORMATS = (
+    '%Y-%m-%dT%H:%M:%S.%f%z',  # With microseconds and timezone
+    '%Y-%m-%dT%H:%M:%S%z',     # Without microseconds, with timezone
+    '%Y-%m-%d %H:%M:%S%z',     # Space separator, with timezone
+    '%Y-%m-%dT%H:%M:%S.%fZ',   # With microseconds, UTC
+    '%Y-%m-%dT%H:%M:%SZ',      # Without microseconds, UTC
+    '%Y-%m-%d %H:%M:%S',       # Local time without timezone
+    '%Y-%m-%d',                # Date only
+    '%d-%m-%Y %H:%M',          # European date format
+    '%m/%d/%Y %I:%M %p',       # US date format with AM/PM
+)
 FALLBACK_CACHE_PATH = Path(os.getenv("SUMMARY_CACHE_PATH", "Summaries/summaries_cache.json"))
 
+# Every dashboard page reads the whole sheet; rows read within this many
+# seconds are served from memory instead of another round of Sheets API calls.
+# 0 disables the cache.
+SHEETS_CACHE_TTL = int(os.getenv("SHEETS_CACHE_TTL", "30"))
+# Limits up to this many rows get their own ranged read (and cache entry);
+# larger ones are sliced from the full-sheet read, so callers passing
+# arbitrary limits can't fill the cache with one entry per value.
+SHEETS_MAX_RANGED_LIMIT = int(os.getenv("SHEETS_MAX_RANGED_LIMIT", "500"))
+_rows_cache: Dict[tuple, tuple] = {}  # (spreadsheet, worksheet, limit) -> (monotonic ts, rows)
+_rows_lock = threading.Lock()  # one sheet read at a time when the cache misses
+
 
 # ---------------------- AUTH ----------------------
+# Authorized gspread client, reused so its HTTP session stays warm
+_client = None
+
+
 def _get_client():
+    global _client
+    if _client is not None:
+        return _client
+
     creds = None
     token_file = os.getenv("GOOGLE_SHEETS_TOKEN", "token_gmail_sheets.pkl")
 
@@ -79,7 +117,8 @@ def _get_client():
                 except:
                     pass
 
-    return gspread.authorize(creds)
+    _client = gspread.authorize(creds)
+    return _client
 
 
 # ---------------------- SPREADSHEET HELPERS ----------------------
@@ -133,24 +172,31 @@ def _parse_date(date_str):
     if isinstance(date_str, datetime):
         return date_str.astimezone(timezone.utc) if date_str.tzinfo else date_str.replace(tzinfo=timezone.utc)
 
+    if not isinstance(date_str, str):
+        return None
+    return _parse_date_str(date_str)
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_str(date_str):
+    """String branch of _parse_date, memoized since the same timestamps recur."""
+    # Fast path: ISO 8601 strings (the common case) parse in C, no format loop
+    if len(date_str) >= 10 and date_str[4] == '-':
+        try:
+            dt = datetime.fromisoformat(date_str)
+        except ValueError:
+            pass
+        else:
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return dt.astimezone(timezone.utc)
+
     # Handle the case where the date string is already in ISO 8601 format with timezone
-    if isinstance(date_str, str) and '+' in date_str and ':' == date_str[-3:-2]:
+    if '+' in date_str and ':' == date_str[-3:-2]:
         # Remove the colon from the timezone offset (e.g., +00:00 -> +0000)
         date_str = date_str[:-3] + date_str[-2:]
     
-    date_formats = [
-        '%Y-%m-%dT%H:%M:%S.%f%z',  # With microseconds and timezone
-        '%Y-%m-%dT%H:%M:%S%z',     # Without microseconds, with timezone
-        '%Y-%m-%d %H:%M:%S%z',     # Space separator, with timezone
-        '%Y-%m-%dT%H:%M:%S.%fZ',   # With microseconds, UTC
-        '%Y-%m-%dT%H:%M:%SZ',      # Without microseconds, UTC
-        '%Y-%m-%d %H:%M:%S',       # Local time without timezone
-        '%Y-%m-%d',                # Date only
-        '%d-%m-%Y %H:%M',          # European date format
-        '%m/%d/%Y %I:%M %p',       # US date format with AM/PM
-    ]
-
-    for fmt in date_formats:
+    for fmt in DATE_FORMATS:
         try:
             dt = datetime.strptime(date_str, fmt)
             if dt.tzinfo is None:
@@ -164,15 +210,59 @@ def _parse_date(date_str):
 
 
 # ---------------------- READ SHEET ----------------------
-def read_all_summaries(spreadsheet_name: Optional[str] = None, worksheet_name: Optional[str] = None) -> list[dict]:
-    """Read all rows safely from Google Sheets."""
+def read_all_summaries(
+    spreadsheet_name: Optional[str] = None,
+    worksheet_name: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> list[dict]:
+    """Read all rows safely from Google Sheets.
+
+    Rows always use the lower-case "role" key, even if the sheet header says "Role".
+
+    With a limit, only the header and the first `limit` data rows are
+    requested (the sheet is kept newest-first by upsert_summaries).
+    Results are shared for SHEETS_CACHE_TTL seconds; callers must not mutate them.
+    """
+    if limit is not None and limit <= 0:
+        limit = None
+    read_limit = limit if limit is not None and limit <= SHEETS_MAX_RANGED_LIMIT else None
+    cache_key = (spreadsheet_name or SPREADSHEET_NAME, worksheet_name or WORKSHEET_NAME, read_limit)
+    rows = _fresh_rows(cache_key)
+    if rows is None:
+        with _rows_lock:
+            # Callers that missed together wait for the first one's read
+            # instead of each re-reading the sheet
+            rows = _fresh_rows(cache_key)
+            if rows is None:
+                rows = _read_rows(spreadsheet_name, worksheet_name, read_limit, cache_key)
+    if limit and read_limit is None:
+        return rows[:limit]
+    return rows
+
+
+def _fresh_rows(cache_key):
+    cached = _rows_cache.get(cache_key)
+    if cached and time.monotonic() - cached[0] < SHEETS_CACHE_TTL:
+        return cached[1]
+    return None
+
+
+def _store_rows(cache_key, rows: List[Dict]) -> None:
+    now = time.monotonic()
+    # Expired entries are dropped here; nothing else evicts them in the dashboard
+    for key in [k for k, (ts, _) in _rows_cache.items() if now - ts >= SHEETS_CACHE_TTL]:
+        _rows_cache.pop(key, None)
+    _rows_cache[cache_key] = (now, rows)
+
+
+def _read_rows(spreadsheet_name, worksheet_name, limit, cache_key) -> List[Dict]:
     try:
         ws = _get_or_create_worksheet(spreadsheet_name, worksheet_name)
 
         # First, get all values to inspect the headers
-        all_values = ws.get_all_values()
+        all_values = ws.get_values(f"1:{limit + 1}") if limit else ws.get_all_values()
         if not all_values:
-            return _fallback_rows_from_cache()
+            return _fallback_rows_from_cache(limit)
 
         # Get the first row as headers and clean them up
         headers = [h.strip() for h in all_values[0]]
@@ -189,6 +279,15 @@ def read_all_summaries(spreadsheet_name: Optional[str] = None, worksheet_name: O
                 clean_headers.append(h)
                 seen.add(h)
 
+        # Readers look up the canonical lower-case "role" only: rename a
+        # legacy "Role" column, or backfill from it if both columns exist
+        role_backfill = False
+        if "Role" in seen:
+            if "role" in seen:
+                role_backfill = True
+            else:
+                clean_headers[clean_headers.index("Role")] = "role"
+
         # Convert rows to dictionaries with clean headers
         rows = []
         for row in all_values[1:]:  # Skip header row
@@ -198,26 +297,29 @@ def read_all_summaries(spreadsheet_name: Optional[str] = None, worksheet_name: O
                     row_dict[clean_headers[i]] = value
                 else:
                     row_dict[f"column_{i}"] = value
+            if role_backfill and not row_dict.get("role"):
+                row_dict["role"] = row_dict.get("Role", "")
             rows.append(row_dict)
 
         if not rows:
-            return _fallback_rows_from_cache()
+            return _fallback_rows_from_cache(limit)
 
-        print(f"[Sheets] ✅ Read {len(rows)} rows (showing up to 5):")
-        import pprint; pprint.pprint(rows[:5])
+        print(f"[Sheets] ✅ Read {len(rows)} rows")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[Sheets] sample rows=%r", rows[:5])
+        _store_rows(cache_key, rows)
         return rows
 
     except Exception as e:
         print(f"[Sheets] ❌ Error reading sheet: {str(e)}")
-        return _fallback_rows_from_cache()
+        return _fallback_rows_from_cache(limit)
 
 
-def _fallback_rows_from_cache() -> List[Dict]:
+def _fallback_rows_from_cache(limit: Optional[int] = None) -> List[Dict]:
     if not FALLBACK_CACHE_PATH.exists():
         return []
     try:
-        with FALLBACK_CACHE_PATH.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = json_load_file(FALLBACK_CACHE_PATH)
     except Exception as exc:
         print(f"[Sheets] ⚠ Fallback cache read failed: {exc}")
         return []
@@ -247,6 +349,8 @@ def _fallback_rows_from_cache() -> List[Dict]:
             "threads": entry.get("threads", []),
             "last_summary": entry.get("last_summary") or entry.get("timestamp") or entry.get("date") or "",
         })
+    if limit:
+        fallback_rows = fallback_rows[:limit]
     if fallback_rows:
         print(f"[Sheets] ⚠ Using fallback cache rows ({len(fallback_rows)})")
     return fallback_rows
@@ -263,8 +367,11 @@ def _merge_summary(old_text: str, new_text: str) -> str:
     return new_text.strip() or old_text.strip()
 
 
-def _normalize_row_payload(row: Dict) -> Dict:
-    """Normalize inbound rows so columns are always present."""
+def _normalize_row_payload(row: Dict, now_iso: Optional[str] = None) -> Dict:
+    """Normalize inbound rows so columns are always present.
+
+    now_iso stamps rows without a date; batch callers pass one value for all rows.
+    """
     if not isinstance(row, dict):
         return {}
 
@@ -283,7 +390,7 @@ def _normalize_row_payload(row: Dict) -> Dict:
     contact_summary = _pick("contact_summary", "summary", "contactSummary", default="")
     last_summary = _pick("last_summary", "lastSummary", "timestamp", "date", default="")
     if not last_summary:
-        last_summary = datetime.now(timezone.utc).isoformat()
+        last_summary = now_iso or datetime.now(timezone.utc).isoformat()
 
     normalized = {
         "id": row_id,
@@ -397,15 +504,18 @@ def upsert_summaries(*args, **kwargs):
     IDEMPOTENT upsert for Google Sheets.
     Only writes to sheet when real changes occur.
     No duplicate rows. Stable keys. 
+    Returns False only when the sheet write itself failed.
     """
 
     new_rows, spreadsheet_name, worksheet_name = _coerce_args(*args, **kwargs)
 
     if not isinstance(new_rows, list) or not new_rows:
         print("[Sheets] No rows to upsert.")
-        return
+        return True
 
     ws = _get_or_create_worksheet(spreadsheet_name, worksheet_name)
+    # One timestamp for every row stamped during this upsert
+    now_iso = datetime.now(timezone.utc).isoformat()
 
     # ------------------------------------------
     # Load existing rows and normalize
@@ -416,7 +526,7 @@ def upsert_summaries(*args, **kwargs):
     try:
         existing_records = ws.get_all_records()
         for rec in existing_records:
-            normalized = _normalize_row_payload(rec)
+            normalized = _normalize_row_payload(rec, now_iso)
             key = _build_unique_key(
                 normalized.get("id"),
                 normalized.get("email"),
@@ -437,7 +547,7 @@ def upsert_summaries(*args, **kwargs):
         if not isinstance(row, dict):
             continue
 
-        normalized = _normalize_row_payload(row)
+        normalized = _normalize_row_payload(row, now_iso)
         key = _build_unique_key(
             normalized.get("id"),
             normalized.get("email"),
@@ -460,7 +570,7 @@ def upsert_summaries(*args, **kwargs):
                 # Preserve last_summary unless content changed
                 if existing_row.get("contact_summary") != normalized.get("contact_summary"):
                     # Summary changed → update timestamp
-                    normalized["last_summary"] = datetime.now(timezone.utc).isoformat()
+                    normalized["last_summary"] = now_iso
                 else:
                     # No content change → keep old timestamp
                     normalized["last_summary"] = existing_row.get("last_summary")
@@ -474,7 +584,7 @@ def upsert_summaries(*args, **kwargs):
     # ------------------------------------------
     if updates == 0 and inserts == 0:
         print("[Sheets] No changes — sheet sync skipped.")
-        return
+        return True
 
     # ------------------------------------------
     # Sort rows (latest first)
@@ -503,9 +613,16 @@ def upsert_summaries(*args, **kwargs):
     # ------------------------------------------
     try:
         ws.update("A1", matrix)
+        # The sheet changed under any rows read in this process
+        sheet = (spreadsheet_name or SPREADSHEET_NAME, worksheet_name or WORKSHEET_NAME)
+        with _rows_lock:  # _store_rows iterates the cache under this lock
+            for key in [k for k in _rows_cache if k[:2] == sheet]:
+                _rows_cache.pop(key, None)
         print(
             f"[Sheets] ✅ Sync complete — "
             f"{updates} updated, {inserts} inserted, total {len(ordered_rows)} rows."
         )
+        return True
     except Exception as e:
         print(f"[Sheets] ❌ Error rewriting sheet: {e}")
+        return False
@@ -1,11 +1,11 @@
-import json
+import threading
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, List, Optional
 from dateutil.parser import parse as parse_dt
 
-from .utils import expand_possible_ids
+from .utils import expand_possible_ids, save_json_atomic, json_load_file
 
 
 
@@ -13,16 +13,17 @@ class ReplyQueue:
     def __init__(self, path: Optional[Path] = None):
         self.path = path or Path("Summaries") / "reply_queue.json"
         self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Serializes load-modify-save cycles from concurrent request threads
+        self._lock = threading.RLock()
 
     def _load(self) -> Dict:
         if self.path.exists():
             try:
-                with self.path.open("r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    if isinstance(data, dict):
-                        data.setdefault("drafts", [])
-                        data["drafts"] = self._dedupe(data["drafts"])
-                        return data
+                data = json_load_file(self.path)
+                if isinstance(data, dict):
+                    data.setdefault("drafts", [])
+                    data["drafts"] = self._dedupe(data["drafts"])
+                    return data
             except Exception:
                 pass
         return {"drafts": []}
@@ -58,8 +59,7 @@ class ReplyQueue:
         return list(latest.values())
 
     def _save(self, data: Dict):
-        with self.path.open("w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        save_json_atomic(self.path, data)
 
     def list_drafts(self, contact_id: Optional[str] = None, statuses: Optional[List[str]] = None) -> List[Dict]:
         queue = self._load()
@@ -101,6 +101,10 @@ class ReplyQueue:
         Add a new draft to the queue.
         Ensures no duplicates for the same (contact_id, thread_id) by keeping the latest draft.
         """
+        with self._lock:
+            self._enqueue_draft(draft)
+
+    def _enqueue_draft(self, draft: Dict):
         queue = self._load()
         now = datetime.now(timezone.utc).isoformat()
 
@@ -143,6 +147,10 @@ class ReplyQueue:
 
 
     def update_draft(self, draft_id: str, **fields) -> Optional[Dict]:
+        with self._lock:
+            return self._update_draft(draft_id, **fields)
+
+    def _update_draft(self, draft_id: str, **fields) -> Optional[Dict]:
         queue = self._load()
         updated = None
         for draft in queue.get("drafts", []):
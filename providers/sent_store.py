@@ -1,8 +1,9 @@
-import json
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from .utils import save_json_atomic, json_load_file
+
 
 class SentStore:
     """
@@ -17,18 +18,16 @@ class SentStore:
     def _load(self) -> Dict:
         if self.path.exists():
             try:
-                with self.path.open("r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    if isinstance(data, dict):
-                        data.setdefault("sent", [])
-                        return data
+                data = json_load_file(self.path)
+                if isinstance(data, dict):
+                    data.setdefault("sent", [])
+                    return data
             except Exception:
                 pass
         return {"sent": []}
 
     def _save(self, data: Dict):
-        with self.path.open("w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        save_json_atomic(self.path, data)
 
     def record(self, to_email: str, subject: str, body: str, source: str = "gmail"):
         """Persist a sent email originating from the Compose feature."""
@@ -1,14 +1,16 @@
 from typing import List, Dict
 from datetime import datetime, timezone
-import json, re, time
+import os, re, time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from email.utils import parsedate_to_datetime
-from Summarizer.groq_summarizer import GroqSummarizer
+from Summarizer.summarize_helper import summarizer as shared_summarizer
 from Gmail.gmail_connector import GmailConnector
 from Outlook.outlook_connector import OutlookConnector
-from classifier.email_classifier import classify_email
+from classifier.email_classifier import classify_emails
 from bs4 import BeautifulSoup
 from providers.reply_queue import ReplyQueue
+from providers.utils import save_json_atomic
 
 
 DEFAULT_REPLY_PROMPT = (
@@ -18,6 +20,22 @@ DEFAULT_REPLY_PROMPT = (
     "Keep the reply under 5 sentences and maintain a professional, helpful tone."
 )
 
+# Threads summarized concurrently per contact (Groq calls are network-bound)
+GROQ_MAX_WORKERS = int(os.getenv("GROQ_MAX_WORKERS", "5"))
+
+# Compiled once: every fetched message body goes through these
+TAG_RE = re.compile(r"<[^>]+>")
+WHITESPACE_RE = re.compile(r"\s+")
+
+def _clean_body(body: str) -> str:
+    """Strip HTML (if present) and collapse whitespace in a message body."""
+    if "<" in body and ">" in body:
+        try:
+            body = BeautifulSoup(body, "html.parser").get_text(separator="\n")
+        except Exception:
+            body = TAG_RE.sub("", body)
+    return WHITESPACE_RE.sub(" ", body).strip()
+
 def _parse_iso(s: str) -> datetime:
     if not s:
         return datetime.min.replace(tzinfo=timezone.utc)
@@ -32,7 +50,9 @@ def _parse_iso(s: str) -> datetime:
 
 class SummariesProvider:
     def __init__(self):
-        self.summarizer = GroqSummarizer()
+        # Shared with the connectors' auto-summarize path, so there is one
+        # in-memory cache per process rather than several overwriting one file
+        self.summarizer = shared_summarizer
         project_root = Path(__file__).resolve().parents[1]
         self.cache_path = project_root / "Summaries" / "summaries_cache.json"
         self.cache_path.parent.mkdir(parents=True, exist_ok=True)
@@ -194,12 +214,14 @@ Write the reply in first person plural ("we") unless the context clearly require
                 else:
                     contact_email = next((r for r in recipients if r != user_email), None) or sender or "unknown@outlook.com"
 
-                contact_entry = contacts_by_email.setdefault(contact_email, {
-                    "email": contact_email,
-                    "threads": [],
-                    "source": "outlook",
-                    "_thread_map": {}
-                })
+                contact_entry = contacts_by_email.get(contact_email)
+                if contact_entry is None:
+                    contact_entry = contacts_by_email[contact_email] = {
+                        "email": contact_email,
+                        "threads": [],
+                        "source": "outlook",
+                        "_thread_map": {}
+                    }
                 contact_entry["_thread_map"].setdefault(conversation_id, True)
 
             # Expand each conversation into full message lists
@@ -214,13 +236,7 @@ Write the reply in first person plural ("we") unless the context clearly require
 
                     normalized_messages = []
                     for msg in full_thread:
-                        body = msg.get("body", "") or ""
-                        if "<" in body and ">" in body:
-                            try:
-                                body = BeautifulSoup(body, "html.parser").get_text(separator="\n")
-                            except Exception:
-                                body = re.sub(r"<[^>]+>", "", body)
-                        body = re.sub(r"\s+", " ", body).strip()
+                        body = _clean_body(msg.get("body", "") or "")
 
                         normalized_messages.append({
                             "sender": msg.get("sender", ""),
@@ -261,12 +277,13 @@ Write the reply in first person plural ("we") unless the context clearly require
 
         try:
             threads = self.gmail.list_threads(limit)
+            messages_by_thread = self.gmail.get_messages([t["id"] for t in threads if t.get("id")])
             for t in threads:
                 tid = t.get("id")
                 if not tid:
                     continue
 
-                thread_messages = self.gmail.get_message(tid)
+                thread_messages = messages_by_thread.get(tid)
                 if not isinstance(thread_messages, list):
                     print(f"[WARN] Thread {tid} messages not a list, skipping...")
                     continue
@@ -282,32 +299,27 @@ Write the reply in first person plural ("we") unless the context clearly require
                         contact_email = sender
                         break
 
-                if contact_email not in contacts_by_email:
-                    contacts_by_email[contact_email] = {
+                contact_entry = contacts_by_email.get(contact_email)
+                if contact_entry is None:
+                    contact_entry = contacts_by_email[contact_email] = {
                         "email": contact_email,
                         "threads": [],
                         "source": "gmail"
                     }
+                contact_threads = contact_entry["threads"]
 
                 # Clean message bodies
                 clean_messages = []
                 for msg in thread_messages:
                     if not isinstance(msg, dict):
                         continue
-                    body = msg.get("body", "")
                     # Strip HTML if present
-                    if "<" in body and ">" in body:
-                        try:
-                            body = BeautifulSoup(body, "html.parser").get_text(separator="\n")
-                        except Exception:
-                            body = re.sub(r"<[^>]+>", "", body)
-                    body = re.sub(r"\s+", " ", body).strip()
-                    clean_messages.append({**msg, "body": body})
+                    clean_messages.append({**msg, "body": _clean_body(msg.get("body", ""))})
 
                 last_msg = clean_messages[-1] if clean_messages else {}
                 last_ts = self._normalize_timestamp(last_msg.get("date", ""))
 
-                contacts_by_email[contact_email]["threads"].append({
+                contact_threads.append({
                     "id": tid,
                     "messages": clean_messages,
                     "last_message_ts": last_ts,
@@ -337,33 +349,50 @@ Write the reply in first person plural ("we") unless the context clearly require
                 t.get("id"): t for t in existing_contact.get("threads", []) if t.get("id")
             }
 
-        for t in contact.get("threads", []):
-            thread_id = t.get("id")
-            thread_ids.append(thread_id)
+        threads = contact.get("threads", [])
 
-            # Build thread message list for summarizer
-            if "messages" in t:
-                thread_emails = t["messages"]
-            else:
-                thread_emails = [{"sender": contact["email"], "subject": t.get("subject", ""), "body": t.get("preview", "")}]
+        # Build thread message lists for summarizer
+        thread_email_lists = [
+            t["messages"] if "messages" in t
+            else [{"sender": contact["email"], "subject": t.get("subject", ""), "body": t.get("preview", "")}]
+            for t in threads
+        ]
 
+        def summarize(thread, thread_emails):
             # Summarize each thread (also caches role/importance)
-            summary = self.summarizer.summarize_thread(
+            return self.summarizer.summarize_thread(
                 thread_emails,
                 source=contact.get("source"),
                 contact_email=contact.get("email"),
-                thread_id=thread_id
+                thread_id=thread.get("id")
             )
 
-            # Append text for contact-level summary
-            all_threads_texts.append(summary)
+        # Threads are independent Groq calls: run up to GROQ_MAX_WORKERS at once,
+        # keeping results in thread order
+        if len(threads) > 1 and GROQ_MAX_WORKERS > 1:
+            with ThreadPoolExecutor(max_workers=min(GROQ_MAX_WORKERS, len(threads))) as pool:
+                thread_summaries = list(pool.map(summarize, threads, thread_email_lists))
+        else:
+            thread_summaries = [summarize(t, emails) for t, emails in zip(threads, thread_email_lists)]
 
-            latest_msg = thread_emails[-1] if thread_emails else {}
-            classification = classify_email(
+        # Classify every thread's latest message in one batch
+        latest_msgs = [thread_emails[-1] if thread_emails else {} for thread_emails in thread_email_lists]
+        classifications = classify_emails(
+            (
                 latest_msg.get("sender", contact.get("email")),
                 latest_msg.get("subject", ""),
-                latest_msg.get("body", "")
+                latest_msg.get("body", ""),
             )
+            for latest_msg in latest_msgs
+        )
+
+        for t, summary, latest_msg, classification in zip(threads, thread_summaries, latest_msgs, classifications):
+            thread_id = t.get("id")
+            thread_ids.append(thread_id)
+
+            # Append text for contact-level summary
+            all_threads_texts.append(summary)
+
             last_ts = t.get("last_message_ts") or self._normalize_timestamp(latest_msg.get("date", ""))
             thread_details[thread_id] = {
                 "importance": classification.get("importance"),
@@ -442,10 +471,18 @@ Write the reply in first person plural ("we") unless the context clearly require
         """
         print("[INFO] Fetching summaries from Gmail + Outlook...")
 
+        # Fetch Outlook in the background while Gmail is fetched and its contacts
+        # summarized; both are network-bound and independent of each other.
+        fetcher = ThreadPoolExecutor(max_workers=1)
+        outlook_future = fetcher.submit(self._from_outlook, limit)
+        fetcher.shutdown(wait=False)
         gmail_data = self._from_gmail(limit)
-        outlook_data = self._from_outlook(limit)
-        all_data = gmail_data + outlook_data
-        print(f"[INFO] ✅ Total contacts fetched: {len(all_data)}")
+
+        def fetched_contacts():
+            yield from gmail_data
+            outlook_data = outlook_future.result()  # _from_outlook handles its own errors
+            print(f"[INFO] ✅ Total contacts fetched: {len(gmail_data) + len(outlook_data)}")
+            yield from outlook_data
 
         # Initialize with existing summaries if available
         if existing_cache and "summaries" in existing_cache:
@@ -468,7 +505,7 @@ Write the reply in first person plural ("we") unless the context clearly require
         processed_keys = set()
 
         # Process new/updated contacts first so cache never suppresses fresh data
-        for contact in all_data:
+        for contact in fetched_contacts():
             contact_email = contact.get("email")
             if not contact_email:
                 continue
@@ -521,8 +558,7 @@ Write the reply in first person plural ("we") unless the context clearly require
 
         # Write cache
         try:
-            with open(self.cache_path, "w", encoding="utf-8") as f:
-                json.dump(cache_data, f, indent=2, ensure_ascii=False)
+            save_json_atomic(self.cache_path, cache_data)
             print(f"[CACHE] ✅ Saved structured cache with {len(merged_summaries)} summaries to {self.cache_path}")
         except Exception as e:
             print(f"[CACHE ERROR] {e}")
@@ -1,3 +1,66 @@
+import json
+import os
+import stat
+import tempfile
+
+# Optional: orjson (de)serializes several times faster than the stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_dumps_bytes(data) -> bytes:
+    """Serialize data to indented UTF-8 JSON bytes, using orjson when installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. lone surrogates or ints beyond 64 bits; the stdlib copes
+    return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8", errors="ignore")
+
+def json_load_file(path):
+    """Read and parse a JSON file, using orjson when installed."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+# Process umask, read once: os.umask can only be queried by setting it, which
+# isn't safe to do per write from several threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def write_bytes_atomic(path, data: bytes) -> None:
+    """Write bytes to path via a temp file + rename, so readers never see a partial file."""
+    directory = os.path.dirname(os.fspath(path)) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the temp file 0600; keep the mode the file already
+        # had (or the usual umask default for a new one) across the replace
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def save_json_atomic(path, data) -> None:
+    """Atomically write data as indented UTF-8 JSON."""
+    write_bytes_atomic(path, json_dumps_bytes(data))
+
 def extract_email(s: str) -> str:
     """Extract email from a string that might be an email or contact ID."""
     if not s:
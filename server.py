@@ -18,8 +18,7 @@ mcp = FastMCP(name="email_mcp_server")
 app.mount("/mcp", mcp)
 from Gmail.gmail_connector import GmailConnector
 from Outlook.outlook_connector import OutlookConnector
-from Summarizer.groq_summarizer import GroqSummarizer
-from Summarizer.summarize_helper import  summarize_contact_logic , summarize_thread_logic 
+from Summarizer.summarize_helper import  summarize_contact_logic , summarize_thread_logic , summarizer
 from classifier.email_classifier import classify_email
 from integrations.google_sheets import upsert_summaries
 from integrations.google_calendar import GoogleCalendar
@@ -33,7 +32,6 @@ logger = logging.getLogger(__name__)
 # Initialize MCP and connectors
 gmail = GmailConnector()
 outlook = OutlookConnector()
-summarizer = GroqSummarizer()  
 sent_store = SentStore()
 
 # Initialize Google Calendar integration